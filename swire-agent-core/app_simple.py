@@ -103,7 +103,12 @@ async def get_tools():
 @app.get("/status")
 async def get_status():
     """Get agent status"""
-    return {"status": "active", "model": "azure_openai", "endpoint": "ready"}
+    return {
+        "status": "active",
+        "model": "azure_openai",
+        "endpoint": "ready",
+        "search_cache": agent_core.get_search_cache_stats()
+    }
 
 @app.post("/process-document")
 async def process_document(file: UploadFile = File(...)):
@@ -2,12 +2,17 @@ import argparse
 import hashlib
 import json
 import os
+import subprocess
+import sys
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
 
+import openai
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ServiceRequestError
 from azure.identity import DefaultAzureCredential
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
@@ -25,9 +30,14 @@ from azure.search.documents.indexes.models import (
     VectorSearch,
     VectorSearchProfile,
 )
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContainerClient, ContentSettings
 from openai import AzureOpenAI
 
+from src.utils.ingest_state import EmbeddingCache, SharedRateLimiter
+from src.utils.pdf_extract import extract_pdf_pages, extract_pdfs
+from src.utils.run_metrics import RunMetrics, merge_reports, stage_summary
+from src.utils.search_cache import IndexGeneration
+
 
 @dataclass
 class Settings:
@@ -41,10 +51,41 @@ class Settings:
     embedding_model: str
     embedding_dim: int
     storage_connection_string: str
+    tables_path: Path
+    state_path: Path
+    embedding_rpm: float
+    embedding_tpm: float
+
+
+@dataclass
+class SharedState:
+    embedding_cache: EmbeddingCache
+    request_limiter: SharedRateLimiter
+    token_limiter: SharedRateLimiter
+    index_generation: IndexGeneration
+
+    def close(self) -> None:
+        self.embedding_cache.close()
+        self.request_limiter.close()
+        self.token_limiter.close()
+        self.index_generation.close()
 
 
-SUPPORTED_TEXT_EXT = {".txt", ".md", ".json", ".csv", ".log"}
+SUPPORTED_TEXT_EXT = {".txt", ".md", ".json", ".log"}
 SUPPORTED_DOC_EXT = {".pdf"}
+SUPPORTED_TABLE_EXT = {".csv"}
+
+TABLE_ROW_GROUP_SIZE = 10_000
+TABLE_TOP_VALUES = 10
+
+BLOB_SINGLE_PUT_SIZE = 8 * 1024 * 1024
+BLOB_BLOCK_SIZE = 4 * 1024 * 1024
+BLOB_UPLOAD_CONCURRENCY = int(os.getenv("AZURE_STORAGE_UPLOAD_CONCURRENCY", "4"))
+
+MAX_ATTEMPTS = 4
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
 
 
 def load_settings() -> Settings:
@@ -57,6 +98,10 @@ def load_settings() -> Settings:
     openai_key = os.getenv("AZURE_OPENAI_KEY", "")
     storage_connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING", "")
     search_key = os.getenv("AZURE_SEARCH_KEY")
+    tables_path = Path(os.getenv("TABLES_PATH", "data/tables"))
+    state_path = Path(os.getenv("INGEST_STATE_PATH", "data/ingest_state.sqlite"))
+    embedding_rpm = float(os.getenv("AZURE_OPENAI_EMBEDDING_RPM", "0"))
+    embedding_tpm = float(os.getenv("AZURE_OPENAI_EMBEDDING_TPM", "0"))
 
     embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
     embedding_dim = int(os.getenv("AZURE_OPENAI_EMBEDDING_DIM", "1536"))
@@ -85,10 +130,117 @@ def load_settings() -> Settings:
         embedding_model=embedding_model,
         embedding_dim=embedding_dim,
         storage_connection_string=storage_connection_string,
+        tables_path=tables_path,
+        state_path=state_path,
+        embedding_rpm=embedding_rpm,
+        embedding_tpm=embedding_tpm,
     )
 
 
-def load_text(file_path: Path) -> str:
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _is_leaf(value: Any) -> bool:
+    # Scalars and flat lists of scalars render on a single "path: value" line.
+    if isinstance(value, list):
+        return all(_is_scalar(item) for item in value)
+    return _is_scalar(value)
+
+
+def _format_leaf(value: Any) -> str:
+    if isinstance(value, list):
+        return "; ".join(_format_leaf(item) for item in value if item not in (None, ""))
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value).strip()
+
+
+def _join_path(path: str, key: Any) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if path else str(key)
+
+
+def flatten_json(value: Any, path: str = "") -> Iterator[str]:
+    """Yield compact "path: value" lines for every non-empty leaf under value."""
+    if _is_leaf(value):
+        text = _format_leaf(value)
+        if text:
+            yield f"{path}: {text}" if path else text
+        return
+
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = enumerate(value)
+
+    for key, child in items:
+        # OData annotations such as "@search.action" carry no knowledge.
+        if isinstance(key, str) and key.startswith("@"):
+            continue
+        yield from flatten_json(child, _join_path(path, key))
+
+
+def json_records(value: Any, path: str = "", max_chars: int = 1800) -> Iterator[str]:
+    """Split a parsed JSON tree into one text unit per logical record.
+
+    A node whose flattened form, including its path header, fits in max_chars
+    is emitted whole. Larger dicts emit their own leaf fields as one record and
+    recurse into nested objects; larger lists recurse into each element.
+    """
+    body = "\n".join(flatten_json(value))
+    if not body:
+        return
+
+    record = f"{path}\n{body}" if path else body
+    if len(record) <= max_chars or _is_leaf(value):
+        yield record
+        return
+
+    if isinstance(value, dict):
+        leaves = {k: v for k, v in value.items() if _is_leaf(v)}
+        own_fields = "\n".join(flatten_json(leaves))
+        if own_fields:
+            yield f"{path}\n{own_fields}" if path else own_fields
+        for key, child in value.items():
+            if key in leaves or (isinstance(key, str) and key.startswith("@")):
+                continue
+            yield from json_records(child, _join_path(path, key), max_chars)
+        return
+
+    for idx, child in enumerate(value):
+        yield from json_records(child, _join_path(path, idx), max_chars)
+
+
+def pack_records(records: Iterable[str], chunk_size: int = 1800) -> List[str]:
+    """Greedily pack whole records into chunks, splitting only oversized ones."""
+    chunks: List[str] = []
+    current = ""
+
+    for record in records:
+        if len(record) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(chunk_text(record, chunk_size=chunk_size))
+            continue
+
+        candidate = f"{current}\n\n{record}" if current else record
+        if len(candidate) > chunk_size:
+            chunks.append(current)
+            current = record
+        else:
+            current = candidate
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def load_text(file_path: Path, metrics: Optional[RunMetrics] = None) -> str:
     suffix = file_path.suffix.lower()
 
     if suffix in SUPPORTED_TEXT_EXT:
@@ -96,20 +248,16 @@ def load_text(file_path: Path) -> str:
         if suffix == ".json":
             try:
                 parsed = json.loads(content)
-                return json.dumps(parsed, indent=2)
+                return "\n\n".join(json_records(parsed))
             except json.JSONDecodeError:
                 return content
         return content
 
     if suffix in SUPPORTED_DOC_EXT:
-        import PyPDF2
-
-        text_parts: List[str] = []
-        with file_path.open("rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text_parts.append(page.extract_text() or "")
-        return "\n".join(text_parts)
+        pages = extract_pdf_pages(file_path)
+        if metrics:
+            metrics.count("pages_parsed", len(pages))
+        return "\n".join(pages)
 
     return ""
 
@@ -134,9 +282,96 @@ def chunk_text(text: str, chunk_size: int = 1800, overlap: int = 250) -> Iterabl
     return chunks
 
 
+def load_chunks(file_path: Path, chunk_size: int = 1800, metrics: Optional[RunMetrics] = None) -> List[str]:
+    """Load a file and split it into index chunks.
+
+    JSON files are packed record-by-record so no object is split mid-way;
+    everything else falls back to character chunking of load_text.
+    """
+    if file_path.suffix.lower() == ".json":
+        content = file_path.read_text(encoding="utf-8", errors="ignore")
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            return list(chunk_text(content, chunk_size=chunk_size))
+        return pack_records(json_records(parsed, max_chars=chunk_size), chunk_size=chunk_size)
+
+    return list(chunk_text(load_text(file_path, metrics), chunk_size=chunk_size))
+
+
+def _column_summary(column, field) -> str:
+    import pyarrow.compute as pc
+    import pyarrow.types as pat
+
+    nulls = column.null_count
+    parts: List[str] = []
+
+    if pat.is_integer(field.type) or pat.is_floating(field.type) or pat.is_decimal(field.type):
+        stats = pc.min_max(column)
+        parts.append(f"min={stats['min'].as_py()}")
+        parts.append(f"max={stats['max'].as_py()}")
+        parts.append(f"sum={pc.sum(column).as_py()}")
+        parts.append(f"mean={pc.mean(column).as_py()}")
+    elif pat.is_string(field.type) or pat.is_large_string(field.type) or pat.is_dictionary(field.type):
+        counts = pc.value_counts(column)
+        ranked = sorted(counts.to_pylist(), key=lambda c: c["counts"], reverse=True)
+        top = ", ".join(str(c["values"]) for c in ranked[:TABLE_TOP_VALUES] if c["values"] is not None)
+        parts.append(f"distinct={len(ranked)}")
+        if top:
+            parts.append(f"top={top}")
+    elif pat.is_temporal(field.type):
+        stats = pc.min_max(column)
+        parts.append(f"from={stats['min'].as_py()}")
+        parts.append(f"to={stats['max'].as_py()}")
+
+    if nulls:
+        parts.append(f"nulls={nulls}")
+    return f"{field.name}: {' '.join(parts)}" if parts else ""
+
+
+def ingest_csv_table(file_path: Path, table_name: str, tables_path: Path) -> List[str]:
+    """Store a CSV as a Parquet side table and return its retrieval summaries.
+
+    The full rows are only available to the agent's table tool; the search
+    index receives a header chunk plus one statistical summary per row group.
+    """
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    table = pacsv.read_csv(file_path)
+    if table.num_rows == 0:
+        return []
+
+    parquet_path = tables_path / f"{table_name}.parquet"
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, parquet_path, row_group_size=TABLE_ROW_GROUP_SIZE)
+
+    columns = ", ".join(f"{field.name} ({field.type})" for field in table.schema)
+    header = (
+        f"table: {table_name}\n"
+        f"rows: {table.num_rows}\n"
+        f"columns: {columns}\n"
+        "Aggregate this table with the Table Query tool instead of reading rows."
+    )
+    chunks = [header]
+
+    for offset in range(0, table.num_rows, TABLE_ROW_GROUP_SIZE):
+        group = table.slice(offset, TABLE_ROW_GROUP_SIZE)
+        lines = [f"table: {table_name} rows {offset}-{offset + group.num_rows - 1}"]
+        for field, column in zip(group.schema, group.columns):
+            summary = _column_summary(column, field)
+            if summary:
+                lines.append(summary)
+        chunks.append("\n".join(lines))
+
+    return chunks
+
+
 def create_clients(settings: Settings):
     credential = AzureKeyCredential(settings.search_key) if settings.search_key else DefaultAzureCredential()
 
+    # SDK-level retries are disabled so with_retries can count every retry; the
+    # index client keeps them, as ensure_index runs before there is a run report.
     index_client = SearchIndexClient(
         endpoint=settings.search_endpoint,
         credential=credential,
@@ -145,14 +380,22 @@ def create_clients(settings: Settings):
         endpoint=settings.search_endpoint,
         index_name=settings.search_index,
         credential=credential,
+        retry_total=0,
     )
 
-    blob_service_client = BlobServiceClient.from_connection_string(settings.storage_connection_string)
+    # Files above the single-put size are sent as parallel block uploads.
+    blob_service_client = BlobServiceClient.from_connection_string(
+        settings.storage_connection_string,
+        retry_total=0,
+        max_single_put_size=BLOB_SINGLE_PUT_SIZE,
+        max_block_size=BLOB_BLOCK_SIZE,
+    )
 
     openai_client = AzureOpenAI(
         api_key=settings.openai_key,
         api_version="2024-05-01-preview",
         azure_endpoint=settings.openai_endpoint,
+        max_retries=0,
     )
 
     return index_client, search_client, blob_service_client, openai_client
@@ -209,47 +452,199 @@ def ensure_index(index_client: SearchIndexClient, settings: Settings) -> None:
     index_client.create_or_update_index(index)
 
 
-def embed_text(client: AzureOpenAI, model: str, text: str) -> List[float]:
-    vector = client.embeddings.create(input=[text], model=model).data[0].embedding
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    if isinstance(error, ServiceRequestError):
+        return True
+    if isinstance(error, HttpResponseError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def with_retries(call: Callable[[], T], metrics: RunMetrics) -> T:
+    """Run call with exponential backoff on throttling and transient errors"""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            metrics.count("retries")
+            time.sleep(min(2**attempt, 30))
+    raise RuntimeError("unreachable")
+
+
+def embed_text(client: AzureOpenAI, model: str, text: str, metrics: Optional[RunMetrics] = None) -> List[float]:
+    response = client.embeddings.create(input=[text], model=model)
+    if metrics and response.usage:
+        metrics.count("tokens_embedded", response.usage.total_tokens)
+    return response.data[0].embedding
+
+
+def open_shared_state(settings: Settings) -> SharedState:
+    return SharedState(
+        embedding_cache=EmbeddingCache(settings.state_path),
+        request_limiter=SharedRateLimiter(settings.state_path, "embedding_requests", settings.embedding_rpm),
+        token_limiter=SharedRateLimiter(settings.state_path, "embedding_tokens", settings.embedding_tpm),
+        index_generation=IndexGeneration(settings.state_path, settings.search_index),
+    )
+
+
+def embed_chunk(
+    client: AzureOpenAI,
+    settings: Settings,
+    text: str,
+    state: SharedState,
+    metrics: RunMetrics,
+) -> List[float]:
+    """Embed text through the shared cache, respecting the shared RPM/TPM budget"""
+    cached = state.embedding_cache.get(settings.embedding_model, text)
+    if cached is not None:
+        metrics.count("embedding_cache_hits")
+        return cached
+
+    # Rough token estimate; the exact count is only known after the call
+    waited = state.request_limiter.acquire()
+    waited += state.token_limiter.acquire(max(1, len(text) // 4))
+    if waited:
+        metrics.observe("rate_limit_wait", waited * 1000)
+
+    vector = with_retries(lambda: embed_text(client, settings.embedding_model, text, metrics), metrics)
+    state.embedding_cache.put(settings.embedding_model, text, vector)
     return vector
 
 
+def file_md5(file_path: Path, block_size: int = 1 << 20) -> bytes:
+    digest = hashlib.md5()
+    with file_path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def list_blob_md5s(container_client: ContainerClient, prefix: str = "") -> Dict[str, bytes]:
+    """Content MD5 of every blob under prefix, from a single paged listing"""
+    md5s: Dict[str, bytes] = {}
+    for blob in container_client.list_blobs(name_starts_with=prefix or None):
+        content_md5 = blob.content_settings.content_md5 if blob.content_settings else None
+        if content_md5:
+            md5s[blob.name] = bytes(content_md5)
+    return md5s
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got: {value}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must satisfy 0 <= i < N, got: {value}")
+    return index, count
+
+
+def in_shard(relative_path: str, shard: Optional[tuple[int, int]]) -> bool:
+    """Stable assignment of a file to one of N shards by hash of its relative path"""
+    if shard is None:
+        return True
+    index, count = shard
+    digest = hashlib.sha256(relative_path.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index
+
+
 def upload_documents(
     settings: Settings,
     search_client: SearchClient,
     blob_service_client: BlobServiceClient,
     openai_client: AzureOpenAI,
+    metrics: RunMetrics,
+    state: SharedState,
+    shard: Optional[tuple[int, int]] = None,
 ) -> tuple[int, int]:
     container_client = blob_service_client.get_container_client(settings.container_name)
-    if not container_client.exists():
-        container_client.create_container()
+
+    def ensure_container() -> None:
+        if not container_client.exists():
+            try:
+                container_client.create_container()
+            except ResourceExistsError:
+                pass  # another shard worker created it first
+
+    # The clients have SDK retries disabled, so every call to them goes through with_retries
+    with_retries(ensure_container, metrics)
 
     indexed = 0
     skipped = 0
 
-    for file_path in settings.data_path.rglob("*"):
-        if not file_path.is_file():
-            continue
+    files = sorted(
+        p
+        for p in settings.data_path.rglob("*")
+        if p.is_file() and in_shard(p.relative_to(settings.data_path).as_posix(), shard)
+    )
 
-        content = load_text(file_path)
-        if not content.strip():
-            skipped += 1
-            continue
+    with metrics.stage("blob_list"):
+        remote_md5s = with_retries(lambda: list_blob_md5s(container_client), metrics)
+
+    # Warm the page cache for every PDF in parallel before the serial upload loop
+    with metrics.stage("pdf_extract"):
+        extract_pdfs(p for p in files if p.suffix.lower() in SUPPORTED_DOC_EXT)
+
+    for done, file_path in enumerate(files, start=1):
+        metrics.progress(done - 1, len(files))
+        metrics.count("files_seen")
 
         relative_path = file_path.relative_to(settings.data_path).as_posix()
         department = file_path.parent.name
 
-        with file_path.open("rb") as data:
-            blob_client = container_client.get_blob_client(relative_path)
-            blob_client.upload_blob(data, overwrite=True)
+        with metrics.stage("parse"):
+            if file_path.suffix.lower() in SUPPORTED_TABLE_EXT:
+                table_name = Path(relative_path).with_suffix("").as_posix()
+                try:
+                    chunks = ingest_csv_table(file_path, table_name, settings.tables_path)
+                except Exception as e:
+                    # pyarrow raises ArrowInvalid for malformed rows; one bad CSV must not end the run
+                    print(f"Skipping unreadable CSV {relative_path}: {e}")
+                    metrics.count("files_failed")
+                    chunks = []
+            else:
+                chunks = load_chunks(file_path, metrics=metrics)
+        if not chunks:
+            skipped += 1
+            metrics.count("files_skipped")
+            continue
+
+        file_size = file_path.stat().st_size
+        metrics.count("bytes_read", file_size)
+        metrics.count("chunks", len(chunks))
+
+        blob_client = container_client.get_blob_client(relative_path)
+        local_md5 = file_md5(file_path)
+
+        def upload_blob() -> None:
+            # Block uploads get no service-computed MD5, so always store ours
+            with file_path.open("rb") as data:
+                blob_client.upload_blob(
+                    data,
+                    overwrite=True,
+                    length=file_size,
+                    max_concurrency=BLOB_UPLOAD_CONCURRENCY,
+                    content_settings=ContentSettings(content_md5=bytearray(local_md5)),
+                )
+
+        if remote_md5s.get(relative_path) == local_md5:
+            metrics.count("blobs_unchanged")
+        else:
+            with metrics.stage("blob_upload"):
+                with_retries(upload_blob, metrics)
+            metrics.count("bytes_uploaded", file_size)
 
-        chunks = chunk_text(content)
         docs_batch = []
         last_modified = datetime.fromtimestamp(file_path.stat().st_mtime, tz=timezone.utc)
 
         for idx, chunk in enumerate(chunks):
             doc_id = hashlib.sha256(f"{relative_path}:{idx}".encode("utf-8")).hexdigest()
-            vector = embed_text(openai_client, settings.embedding_model, chunk)
+            with metrics.stage("embed"):
+                vector = embed_chunk(openai_client, settings, chunk, state, metrics)
 
             docs_batch.append(
                 {
@@ -266,19 +661,71 @@ def upload_documents(
             )
 
         if docs_batch:
-            search_client.merge_or_upload_documents(docs_batch)
+            with metrics.stage("search_upload"):
+                with_retries(lambda: search_client.merge_or_upload_documents(docs_batch), metrics)
+            # Lets the backend drop search results cached before this upload
+            state.index_generation.bump()
             indexed += len(docs_batch)
-            print(f"Indexed {len(docs_batch)} chunks from {relative_path}")
+            metrics.count("docs_uploaded", len(docs_batch))
+            if not metrics.show_progress:
+                print(f"Indexed {len(docs_batch)} chunks from {relative_path}")
 
+    metrics.progress(len(files), len(files))
     return indexed, skipped
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Ingest operations manuals into Blob + Azure AI Search")
     parser.add_argument("--create-index", action="store_true", help="Create or update the AI Search index before ingestion")
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=Path(os.getenv("INGEST_REPORT_PATH", "logs/ingest-report.json")),
+        help="Where to write the JSON run report with per-stage timings and counters",
+    )
+    parser.add_argument("--progress", action="store_true", help="Show a live progress line with throughput and ETA")
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Only ingest files whose path hash falls in shard i of N (e.g. 0/4)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Coordinate N local worker processes, one per shard, and merge their run reports",
+    )
     return parser.parse_args()
 
 
+def run_workers(args: argparse.Namespace) -> int:
+    """Launch one worker per shard and merge their reports into args.report"""
+    started = time.monotonic()
+    shard_reports = [
+        args.report.with_name(f"{args.report.stem}.shard-{i}-of-{args.workers}{args.report.suffix}")
+        for i in range(args.workers)
+    ]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--shard", f"{i}/{args.workers}", "--report", str(path)]
+        )
+        for i, path in enumerate(shard_reports)
+    ]
+    exit_codes = [process.wait() for process in processes]
+
+    reports = [json.loads(path.read_text(encoding="utf-8")) for path in shard_reports if path.exists()]
+    merged = merge_reports("ingest_operations_data", reports, time.monotonic() - started)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(merged, indent=2), encoding="utf-8")
+    print("\n".join(stage_summary(merged)))
+    print(f"Merged report from {len(reports)}/{args.workers} workers written to {args.report}")
+
+    failed = [i for i, code in enumerate(exit_codes) if code != 0]
+    if failed:
+        print(f"Workers failed for shards: {', '.join(map(str, failed))}")
+    return 1 if failed else 0
+
+
 def main() -> None:
     args = parse_args()
     settings = load_settings()
@@ -292,7 +739,22 @@ def main() -> None:
         ensure_index(index_client, settings)
         print(f"Index ready: {settings.search_index}")
 
-    indexed, skipped = upload_documents(settings, search_client, blob_service_client, openai_client)
+    if args.workers > 1:
+        sys.exit(run_workers(args))
+
+    run_name = f"ingest_operations_data[{args.shard[0]}/{args.shard[1]}]" if args.shard else "ingest_operations_data"
+    metrics = RunMetrics(run_name, show_progress=args.progress)
+    state = open_shared_state(settings)
+    try:
+        indexed, skipped = upload_documents(
+            settings, search_client, blob_service_client, openai_client, metrics, state, args.shard
+        )
+    finally:
+        state.close()
+        report = metrics.write_report(args.report)
+        print("\n".join(stage_summary(report)))
+        print(f"Run report written to {args.report}")
+
     print(f"Completed ingestion. Indexed chunks: {indexed}, skipped files: {skipped}")
 
 
@@ -3,9 +3,22 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 import logging
 from .swire_specialist_agent import SwireSpecialistAgent
+from ..utils.keyword_classifier import KeywordClassifier
 
 logger = logging.getLogger(__name__)
 
+# Domains first, in routing order, then the multi-agent cues
+QUERY_KEYWORDS = KeywordClassifier({
+    "finance": ["financial", "budget", "cost", "revenue", "profit", "expense"],
+    "safety": ["safety", "hse", "incident", "ppe", "accident", "compliance"],
+    "operations": ["operations", "shift", "schedule", "maintenance", "performance"],
+    "wind_energy": ["wind", "turbine", "blade", "nacelle", "tower"],
+    "solar_energy": ["solar", "panel", "inverter", "pv", "photovoltaic"],
+    "comparison": ["compare", "vs", "versus", "correlation", "relationship", "impact"],
+    "summary": ["dashboard", "summary", "overview", "report", "combined"]
+})
+DOMAINS = ["finance", "safety", "operations", "wind_energy", "solar_energy"]
+
 class MultiAgentOrchestrator:
     """Orchestrates multiple specialized agents for complex queries"""
     
@@ -27,29 +40,16 @@ class MultiAgentOrchestrator:
     
     def _analyze_query_complexity(self, query: str) -> Dict[str, Any]:
         """Analyze if query requires multiple agents"""
-        query_lower = query.lower()
+        hits = QUERY_KEYWORDS.counts(query)
         
         # Detect multiple domains in query
-        domains_mentioned = []
-        domain_keywords = {
-            "finance": ["financial", "budget", "cost", "revenue", "profit", "expense"],
-            "safety": ["safety", "hse", "incident", "ppe", "accident", "compliance"],
-            "operations": ["operations", "shift", "schedule", "maintenance", "performance"],
-            "wind_energy": ["wind", "turbine", "blade", "nacelle", "tower"],
-            "solar_energy": ["solar", "panel", "inverter", "pv", "photovoltaic"]
-        }
-        
-        for domain, keywords in domain_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                domains_mentioned.append(domain)
+        domains_mentioned = [domain for domain in DOMAINS if hits[domain]]
         
         # Check for comparison or correlation keywords
-        comparison_keywords = ["compare", "vs", "versus", "correlation", "relationship", "impact"]
-        has_comparison = any(keyword in query_lower for keyword in comparison_keywords)
+        has_comparison = hits["comparison"] > 0
         
         # Check for dashboard/summary keywords
-        summary_keywords = ["dashboard", "summary", "overview", "report", "combined"]
-        needs_summary = any(keyword in query_lower for keyword in summary_keywords)
+        needs_summary = hits["summary"] > 0
         
         requires_multiple = len(domains_mentioned) > 1 or has_comparison or needs_summary
         
@@ -58,7 +58,8 @@ class MultiAgentOrchestrator:
             "domains": domains_mentioned,
             "has_comparison": has_comparison,
             "needs_summary": needs_summary,
-            "complexity_score": len(domains_mentioned) + (1 if has_comparison else 0) + (1 if needs_summary else 0)
+            "complexity_score": len(domains_mentioned) + (1 if has_comparison else 0) + (1 if needs_summary else 0),
+            "keyword_hits": {category: count for category, count in hits.items() if count}
         }
     
     async def _multi_agent_processing(self, query: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
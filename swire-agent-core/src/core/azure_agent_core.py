@@ -1,8 +1,11 @@
 import os
+from pathlib import Path
 from typing import Any, Dict, List
 
 from openai import AzureOpenAI
 
+from src.utils.search_cache import IndexGeneration, SearchResultCache
+
 
 class AzureAgentCore:
     def __init__(self):
@@ -49,6 +52,22 @@ class AzureAgentCore:
             except Exception as e:
                 print(f"Warning: Azure Search init failed: {e}")
 
+        # Repeated queries reuse retrieval results until they expire or ingestion
+        # bumps the index generation in the shared ingest state
+        generation = None
+        try:
+            index_generation = IndexGeneration(
+                Path(os.getenv("INGEST_STATE_PATH", "data/ingest_state.sqlite")), self.search_index
+            )
+            generation = index_generation.current
+        except Exception as e:
+            print(f"Warning: index generation unavailable, search cache uses TTL only: {e}")
+        self.search_cache = SearchResultCache(
+            ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300")),
+            max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000")),
+            generation=generation,
+        )
+
     async def process_query(self, query: str) -> Dict[str, Any]:
         if not self.client:
             return self._mock_response(query)
@@ -92,10 +111,20 @@ class AzureAgentCore:
             "mock": True,
         }
 
+    def get_search_cache_stats(self) -> Dict[str, Any]:
+        return self.search_cache.stats()
+
     def _search_context(self, query: str) -> tuple[str, List[str]]:
         if not self.search_client or not self.client:
             return "", []
 
+        cache_key = self.search_cache.key(query, top=3)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            # Callers own the returned sources list; the cached one stays intact
+            context, sources = cached
+            return context, list(sources)
+
         try:
             from azure.search.documents.models import VectorizedQuery
 
@@ -132,7 +161,9 @@ class AzureAgentCore:
                 if source:
                     sources.append(source)
 
-            return "\n\n".join(context_parts), sources
+            context = "\n\n".join(context_parts)
+            self.search_cache.put(cache_key, (context, tuple(sources)))
+            return context, sources
         except Exception as e:
             print(f"Search failed, falling back to direct chat: {e}")
             return "", []
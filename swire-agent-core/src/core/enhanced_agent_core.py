@@ -8,10 +8,22 @@ from ..tools.finance import get_finance_data
 from ..tools.hse import get_hse_reports
 from ..tools.db_connector import db_connector
 from ..tools.knowledge import search_knowledge
+from ..tools.tables import query_tables
 from ..agents.multi_agent_orchestrator import MultiAgentOrchestrator
+from ..utils.keyword_classifier import KeywordClassifier
 
 logger = logging.getLogger(__name__)
 
+# Fallback intent rules, applied in order: (category, keywords, tools, intent, confidence)
+INTENT_RULES = [
+    ("financial", ["financial", "finance", "revenue", "profit", "expense", "cost", "budget"], ["finance"], "financial", 0.8),
+    ("hr", ["man-hours", "hours", "employee", "staff", "workforce", "productivity"], ["database", "tables"], "hr", 0.8),
+    ("safety", ["safety", "hse", "incident", "accident", "ppe", "compliance"], ["hse", "tables"], "safety", 0.8),
+    ("knowledge", ["policy", "procedure", "guideline", "document", "manual"], ["knowledge"], "operational", 0.7),
+    ("summary", ["dashboard", "summary", "overview", "report"], ["finance", "database", "hse"], "operational", 0.9),
+]
+INTENT_KEYWORDS = KeywordClassifier({category: keywords for category, keywords, *_ in INTENT_RULES})
+
 class SwireAgentCore:
     """Enhanced Agent Core with tool orchestration, reasoning, and multi-agent collaboration"""
     
@@ -43,6 +55,11 @@ class SwireAgentCore:
                 "function": search_knowledge,
                 "description": "Search knowledge base for relevant documents and information",
                 "parameters": ["query"]
+            },
+            "tables": {
+                "function": query_tables,
+                "description": "Compute aggregates over ingested CSV tables such as man-hours and incidents",
+                "parameters": ["query"]
             }
         }
     
@@ -104,7 +121,7 @@ class SwireAgentCore:
         intent_prompt = f"""
         Analyze this user query and determine:
         1. Primary intent (financial, safety, hr, operational, general)
-        2. Required tools (finance, hse, database, knowledge)
+        2. Required tools (finance, hse, database, knowledge, tables)
         3. Confidence level (0.0-1.0)
         
         Query: "{query}"
@@ -114,6 +131,7 @@ class SwireAgentCore:
         - hse: Safety reports, incident analysis, compliance data
         - database: HR data, man-hours, employee information
         - knowledge: Document search, policies, procedures
+        - tables: Computed totals and averages over ingested CSV tables (man-hours, incidents)
         
         Respond in JSON format:
         {{
@@ -135,41 +153,18 @@ class SwireAgentCore:
     
     def _fallback_intent_analysis(self, query: str) -> Dict[str, Any]:
         """Fallback intent analysis using keyword matching"""
-        query_lower = query.lower()
+        hits = INTENT_KEYWORDS.counts(query)
         
         tools = []
         intent = "general"
         confidence = 0.7
         
-        # Financial keywords
-        if any(word in query_lower for word in ["financial", "finance", "revenue", "profit", "expense", "cost", "budget"]):
-            tools.append("finance")
-            intent = "financial"
-            confidence = 0.8
-        
-        # HR/Man-hours keywords
-        if any(word in query_lower for word in ["man-hours", "hours", "employee", "staff", "workforce", "productivity"]):
-            tools.append("database")
-            intent = "hr"
-            confidence = 0.8
-        
-        # Safety keywords
-        if any(word in query_lower for word in ["safety", "hse", "incident", "accident", "ppe", "compliance"]):
-            tools.append("hse")
-            intent = "safety"
-            confidence = 0.8
-        
-        # Knowledge/document keywords
-        if any(word in query_lower for word in ["policy", "procedure", "guideline", "document", "manual"]):
-            tools.append("knowledge")
-            intent = "operational"
-            confidence = 0.7
-        
-        # Dashboard/summary keywords
-        if any(word in query_lower for word in ["dashboard", "summary", "overview", "report"]):
-            tools.extend(["finance", "database", "hse"])
-            intent = "operational"
-            confidence = 0.9
+        # Later matching rules take over the intent; tools accumulate
+        for category, _, rule_tools, rule_intent, rule_confidence in INTENT_RULES:
+            if hits[category]:
+                tools.extend(rule_tools)
+                intent = rule_intent
+                confidence = rule_confidence
         
         # Default to knowledge search if no specific tools identified
         if not tools:
@@ -1,9 +1,10 @@
 import os
+from pathlib import Path
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import pickle
-import PyPDF2
+from src.utils.pdf_extract import extract_pdfs
 
 class RAGPipeline:
     def __init__(self):
@@ -21,17 +22,14 @@ class RAGPipeline:
             os.makedirs(docs_dir)
             return ["Sample document: Swire Renewables operational guidelines and safety protocols."]
         
+        pdf_files = [os.path.join(docs_dir, f) for f in os.listdir(docs_dir) if f.endswith('.pdf')]
+        pdf_pages = extract_pdfs(pdf_files, max_pages=5)  # First 5 pages
+        
         for filename in os.listdir(docs_dir):
             if filename.endswith('.pdf'):
-                try:
-                    with open(os.path.join(docs_dir, filename), 'rb') as file:
-                        reader = PyPDF2.PdfReader(file)
-                        text = ""
-                        for page in reader.pages[:5]:  # First 5 pages
-                            text += page.extract_text()
-                        documents.append(f"{filename}: {text[:1000]}")
-                except:
-                    continue
+                text = "".join(pdf_pages.get(Path(os.path.join(docs_dir, filename)), []))
+                if text:
+                    documents.append(f"{filename}: {text[:1000]}")
             elif filename.endswith('.txt'):
                 with open(os.path.join(docs_dir, filename), 'r') as file:
                     documents.append(f"{filename}: {file.read()[:1000]}")
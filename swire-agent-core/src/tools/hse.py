@@ -1,6 +1,7 @@
 import os
-import PyPDF2
+from pathlib import Path
 from langchain.tools import Tool
+from src.utils.pdf_extract import extract_pdfs
 
 def get_hse_reports(query: str = "") -> str:
     """Read HSE reports from PDFs and extract incident summaries"""
@@ -15,17 +16,15 @@ def get_hse_reports(query: str = "") -> str:
     if not pdf_files:
         return "No PDF reports found in HSE directory. Mock data: 3 minor incidents this month, 0 major incidents, safety score: 95%"
     
-    for pdf_file in pdf_files[:3]:  # Limit to first 3 files
-        try:
-            with open(os.path.join(hse_dir, pdf_file), 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages[:2]:  # First 2 pages only
-                    text += page.extract_text()
-                
-                reports.append(f"Report {pdf_file}: {text[:200]}...")
-        except Exception as e:
-            reports.append(f"Error reading {pdf_file}: {str(e)}")
+    pdf_files = pdf_files[:3]  # Limit to first 3 files
+    pages = extract_pdfs([Path(hse_dir) / f for f in pdf_files], max_pages=2)  # First 2 pages only
+    
+    for pdf_file in pdf_files:
+        text = "".join(pages.get(Path(hse_dir) / pdf_file, []))
+        if text:
+            reports.append(f"Report {pdf_file}: {text[:200]}...")
+        else:
+            reports.append(f"Error reading {pdf_file}: no text could be extracted")
     
     return "\n".join(reports) if reports else "No HSE data available"
 
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from langchain.tools import Tool
+
+TABLES_PATH = os.getenv("TABLES_PATH", "data/tables")
+AGGREGATIONS = {"sum", "mean", "min", "max", "count", "count_distinct"}
+
+
+def list_tables() -> List[str]:
+    """Names of the Parquet side tables written by ingest_operations_data"""
+    if not os.path.exists(TABLES_PATH):
+        return []
+
+    names = []
+    for root, _, files in os.walk(TABLES_PATH):
+        for filename in files:
+            if filename.endswith(".parquet"):
+                relative = os.path.relpath(os.path.join(root, filename), TABLES_PATH)
+                names.append(relative[: -len(".parquet")].replace(os.sep, "/"))
+    return sorted(names)
+
+
+def load_table(name: str):
+    # Names come from the model's tool input; only ingested tables may be opened
+    if name not in list_tables():
+        raise FileNotFoundError(f"Unknown table: {name}")
+    return _read_table(name)
+
+
+def _read_table(name: str):
+    """Read a table already known to be in list_tables()"""
+    import pyarrow.parquet as pq
+
+    return pq.read_table(os.path.join(TABLES_PATH, f"{name}.parquet"))
+
+
+def aggregate_table(
+    table: str,
+    column: str,
+    op: str = "sum",
+    by: Optional[str] = None,
+    where: Optional[Dict[str, Any]] = None,
+    limit: int = 10,
+) -> List[Dict[str, Any]]:
+    """Vectorised aggregate of one column, optionally grouped and filtered"""
+    import pyarrow.compute as pc
+
+    if op not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation '{op}', use one of {sorted(AGGREGATIONS)}")
+
+    data = load_table(table)
+    for key, value in (where or {}).items():
+        data = data.filter(pc.equal(data[key], value))
+
+    if not by:
+        return [{column: getattr(pc, op)(data[column]).as_py(), "rows": data.num_rows}]
+
+    grouped = data.group_by(by).aggregate([(column, op)])
+    result_column = f"{column}_{op}"
+    rows = grouped.sort_by([(result_column, "descending")]).to_pylist()
+    return rows[:limit]
+
+
+def _format_number(value: Any) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value:,}"
+
+
+def _match_columns(query_words: set, names: List[str]) -> List[str]:
+    matched = []
+    for name in names:
+        parts = set(re.split(r"[_\W]+", name.lower())) - {""}
+        if parts & query_words:
+            matched.append(name)
+    return matched
+
+
+def _answer_free_text(query: str) -> str:
+    import pyarrow.types as pat
+
+    query_words = set(re.findall(r"[a-z0-9]+", query.lower()))
+    query_words |= {word.rstrip("s") for word in query_words}
+    tables = list_tables()
+    if not tables:
+        return "No tables available. Add CSV files to enterprise-data and run ingestion."
+
+    # Pick the table whose name and columns share the most words with the query
+    best_name, best_score, best_table = None, 0, None
+    for name in tables:
+        table = _read_table(name)
+        score = len(_match_columns(query_words, [name] + table.column_names))
+        if score > best_score:
+            best_name, best_score, best_table = name, score, table
+
+    if best_table is None:
+        return f"No table matches the query. Available tables: {', '.join(tables)}"
+
+    numeric = [f.name for f in best_table.schema if pat.is_integer(f.type) or pat.is_floating(f.type)]
+    categorical = [f.name for f in best_table.schema if pat.is_string(f.type)]
+    measures = _match_columns(query_words, numeric) or numeric
+    group_by = next(iter(_match_columns(query_words, categorical)), None)
+
+    lines = [f"Table {best_name} ({best_table.num_rows} rows)"]
+    for measure in measures:
+        rows = aggregate_table(best_name, measure, "sum", by=group_by)
+        if group_by:
+            ranked = ", ".join(f"{row[group_by]}: {_format_number(row[f'{measure}_sum'])}" for row in rows)
+            lines.append(f"{measure} by {group_by}: {ranked}")
+        else:
+            lines.append(f"total {measure}: {_format_number(rows[0][measure])}")
+    return "\n".join(lines)
+
+
+def query_tables(query: str = "") -> str:
+    """Compute answers from ingested CSV tables.
+
+    Accepts either a JSON spec such as
+    {"table": "hr/man_hours", "column": "hours", "op": "sum", "by": "site"}
+    or a free-text question, which is matched to the closest table.
+    """
+    try:
+        spec = json.loads(query) if query.strip().startswith("{") else None
+        if spec:
+            rows = aggregate_table(**spec)
+            return json.dumps(rows, default=str)
+        return _answer_free_text(query)
+    except Exception as e:
+        return f"Table query failed: {str(e)}"
+
+
+def get_tools():
+    return [
+        Tool(
+            name="Table Query",
+            func=query_tables,
+            description=(
+                "Compute sums, averages, counts, min or max over ingested CSV tables "
+                "(man-hours, incidents, timesheets). Input is a question or a JSON spec "
+                '{"table", "column", "op", "by", "where"}. Available tables: '
+                + (", ".join(list_tables()) or "none")
+            ),
+        )
+    ]
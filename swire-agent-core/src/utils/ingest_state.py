@@ -0,0 +1,114 @@
+"""Process-safe state shared by ingestion workers: embedding cache and rate limiter.
+
+All live in one SQLite database (WAL mode), so any number of worker
+processes on the same host can use them concurrently; SQLite's own locking
+serialises writers. WAL relies on shared memory, so the database must sit on
+a local disk of that host: it is not safe on a network filesystem, and
+workers on several nodes need a real shared store instead.
+"""
+
+import hashlib
+import sqlite3
+import struct
+import time
+from pathlib import Path
+from typing import List, Optional
+
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class EmbeddingCache:
+    """Embedding vectors keyed on sha256(model, text), stored as packed float32"""
+
+    def __init__(self, path: Path):
+        self.conn = _connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        row = self.conn.execute(
+            "SELECT dim, vector FROM embeddings WHERE key = ?", (self.key(model, text),)
+        ).fetchone()
+        if row is None:
+            return None
+        dim, blob = row
+        return list(struct.unpack(f"{dim}f", blob))
+
+    def put(self, model: str, text: str, vector: List[float]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+            (self.key(model, text), len(vector), struct.pack(f"{len(vector)}f", *vector)),
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class SharedRateLimiter:
+    """Token bucket whose state is shared by every process using the same database.
+
+    rate_per_minute of 0 disables limiting. acquire blocks until cost units
+    are available and returns the number of seconds spent waiting.
+    """
+
+    def __init__(self, path: Path, name: str, rate_per_minute: float):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.conn = _connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def acquire(self, cost: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+
+        cost = min(cost, self.capacity)
+        waited = 0.0
+        while True:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self.conn.execute(
+                    "SELECT tokens, updated FROM rate_limits WHERE name = ?", (self.name,)
+                ).fetchone()
+                tokens, updated = row if row else (self.capacity, now)
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+
+                if tokens >= cost:
+                    tokens -= cost
+                    delay = 0.0
+                else:
+                    delay = (cost - tokens) / self.rate
+
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)",
+                    (self.name, tokens, now),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            if delay == 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def close(self) -> None:
+        self.conn.close()
+
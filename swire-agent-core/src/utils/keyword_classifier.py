@@ -0,0 +1,75 @@
+"""Shared keyword classifier for routing queries and labelling documents.
+
+The knowledge base pipeline in swire-copilot-assistant deploys on its own, so
+it carries a verbatim copy of this file. Edit this one, copy it over, and keep
+it free of imports from the rest of the package; test_shared_modules.py fails
+while the two differ.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Regex for a keyword trie that prefers the longest keyword at each position"""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in node.items() if char]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 and len(branches[0]) == 1 else f"(?:{'|'.join(branches)})"
+    # A keyword ending here is still a match if no longer one continues it
+    return f"{pattern}?" if "" in node else pattern
+
+
+class KeywordClassifier:
+    """Per-category keyword hit counts for case-insensitive substring matches.
+
+    All keywords are compiled into one trie-shaped regex, so the lowercased
+    text is scanned once however many keywords there are. Every position
+    where a keyword starts is found, including keywords that overlap or
+    contain one another; keywords shared by several categories count for
+    each of them.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories = list(categories)
+        owners: Dict[str, List[str]] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                owner = owners.setdefault(keyword.lower(), [])
+                if category not in owner:
+                    owner.append(category)
+
+        trie: Dict = {}
+        for keyword in owners:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self._pattern: Optional[re.Pattern] = (
+            re.compile(f"(?=({_trie_pattern(trie)}))", re.DOTALL) if owners else None
+        )
+
+        # The regex reports the longest keyword at a position; every keyword
+        # that is a prefix of it starts there too
+        self._credits: Dict[str, Counter] = {}
+        for longest in owners:
+            credits = Counter()
+            for keyword, owner in owners.items():
+                if longest.startswith(keyword):
+                    credits.update(owner)
+            self._credits[longest] = credits
+
+    def counts(self, text: str) -> Dict[str, int]:
+        """Number of keyword occurrences per category, 0 for categories with no hits"""
+        counts = dict.fromkeys(self.categories, 0)
+        if self._pattern is None:
+            return counts
+        for match in self._pattern.finditer(text.lower()):
+            for category, hits in self._credits[match.group(1)].items():
+                counts[category] += hits
+        return counts
+
+    def matches(self, text: str) -> List[str]:
+        """Categories with at least one hit, in the order they were defined"""
+        return [category for category, hits in self.counts(text).items() if hits]
@@ -0,0 +1,212 @@
+"""Shared PDF text extraction with a per-page cache keyed on file hash.
+
+Pages are extracted one at a time and written to the cache as they are read,
+so repeated calls (ingestion, the RAG pipeline, the HSE tool) never parse the
+same file twice. Batch extraction runs each file in its own worker process so
+a corrupt or pathological PDF can be killed after a timeout instead of
+hanging the caller.
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_PATH = Path(os.getenv("PDF_CACHE_PATH", "data/pdf_cache"))
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", "60"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+# A file that timed out is skipped for this long, doubling each time it times out again
+PDF_TIMEOUT_RETRY_SECONDS = float(os.getenv("PDF_TIMEOUT_RETRY_SECONDS", "3600"))
+
+
+def file_digest(path: Path, block_size: int = 1 << 20) -> str:
+    """sha256 of the file contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_dir(digest: str) -> Path:
+    return PDF_CACHE_PATH / digest[:2] / digest
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_meta(digest: str) -> Optional[Dict]:
+    meta_path = _cache_dir(digest) / "meta.json"
+    if not meta_path.exists():
+        return None
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _page_path(digest: str, page_number: int) -> Path:
+    return _cache_dir(digest) / f"{page_number:05d}.txt"
+
+
+def _page_limit(page_count: int, max_pages: Optional[int]) -> int:
+    return page_count if max_pages is None else min(page_count, max_pages)
+
+
+def _cached_pages(digest: str, max_pages: Optional[int]) -> Optional[List[str]]:
+    """All requested pages if they are cached, [] for a known-bad or recently timed-out file, else None"""
+    meta = _read_meta(digest)
+    if meta is None:
+        return None
+    if meta.get("error"):
+        return []
+    if "pages" not in meta:
+        # Timed out before: skip until the retry time, then extract again
+        return [] if time.time() < meta.get("retry_after", 0) else None
+
+    pages = []
+    for page_number in range(_page_limit(meta["pages"], max_pages)):
+        page_path = _page_path(digest, page_number)
+        if not page_path.exists():
+            return None
+        pages.append(page_path.read_text(encoding="utf-8"))
+    return pages
+
+
+def iter_pdf_pages(path: Path, max_pages: Optional[int] = None, digest: Optional[str] = None) -> Iterator[str]:
+    """Stream page text in-process, filling the cache for pages not yet seen"""
+    import PyPDF2
+
+    digest = digest or file_digest(path)
+    cache_dir = _cache_dir(digest)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    meta = _read_meta(digest)
+    if meta and meta.get("error"):
+        return
+
+    with open(path, "rb") as f:
+        reader = None
+        page_count = meta.get("pages") if meta else None
+
+        if page_count is None:
+            reader = PyPDF2.PdfReader(f)
+            page_count = len(reader.pages)
+            # Keep the timeout count so a file that is slow again backs off further
+            timeouts = {"timeouts": meta["timeouts"]} if meta and "timeouts" in meta else {}
+            _write_atomic(cache_dir / "meta.json", json.dumps({"pages": page_count, "source": str(path), **timeouts}))
+
+        for page_number in range(_page_limit(page_count, max_pages)):
+            page_path = _page_path(digest, page_number)
+            if page_path.exists():
+                yield page_path.read_text(encoding="utf-8")
+                continue
+
+            if reader is None:
+                reader = PyPDF2.PdfReader(f)
+            text = reader.pages[page_number].extract_text() or ""
+            _write_atomic(page_path, text)
+            yield text
+
+
+def _mark_failed(digest: str, path: str, error: str) -> None:
+    """Remember a file that failed to parse, so later calls skip it until its contents change"""
+    cache_dir = _cache_dir(digest)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _write_atomic(cache_dir / "meta.json", json.dumps({"error": error, "source": path}))
+
+
+def _defer_retry(digest: str, path: str) -> None:
+    """Skip a file for a while without blacklisting it: a timeout or a killed worker may be a one-off"""
+    previous = _read_meta(digest) or {}
+    timeouts = previous.get("timeouts", 0) + 1
+    retry_after = time.time() + PDF_TIMEOUT_RETRY_SECONDS * 2 ** (timeouts - 1)
+    cache_dir = _cache_dir(digest)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _write_atomic(
+        cache_dir / "meta.json", json.dumps({"timeouts": timeouts, "retry_after": retry_after, "source": path})
+    )
+
+
+def _extract_worker(path: str, digest: str, max_pages: Optional[int]) -> None:
+    try:
+        for _ in iter_pdf_pages(Path(path), max_pages=max_pages, digest=digest):
+            pass
+    except Exception as e:
+        _mark_failed(digest, path, str(e))
+        raise SystemExit(1)
+
+
+def extract_pdfs(
+    paths: Iterable[Path],
+    max_pages: Optional[int] = None,
+    workers: int = PDF_WORKERS,
+    timeout: float = PDF_TIMEOUT_SECONDS,
+) -> Dict[Path, List[str]]:
+    """Extract many PDFs across worker processes, returning page text per path.
+
+    Cache hits are served without starting a worker. Files that fail to parse
+    or exceed the timeout map to an empty list. Parse failures are not retried
+    until the file's contents change; timeouts are retried after
+    PDF_TIMEOUT_RETRY_SECONDS, doubling each time the file times out again.
+    """
+    results: Dict[Path, List[str]] = {}
+    pending = []
+
+    for path in paths:
+        path = Path(path)
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            logger.warning(f"Cannot read PDF {path}: {e}")
+            results[path] = []
+            continue
+
+        cached = _cached_pages(digest, max_pages)
+        if cached is not None:
+            results[path] = cached
+        else:
+            pending.append((path, digest))
+
+    running = {}
+    while pending or running:
+        while pending and len(running) < max(workers, 1):
+            path, digest = pending.pop(0)
+            process = multiprocessing.Process(target=_extract_worker, args=(str(path), digest, max_pages), daemon=True)
+            process.start()
+            running[path] = (process, digest, time.monotonic())
+
+        time.sleep(0.05)
+        for path, (process, digest, started) in list(running.items()):
+            if process.is_alive():
+                if time.monotonic() - started < timeout:
+                    continue
+                process.terminate()
+                process.join()
+                logger.warning(f"PDF extraction timed out after {timeout:.0f}s, skipping: {path}")
+                _defer_retry(digest, str(path))
+                results[path] = []
+            else:
+                process.join()
+                if process.exitcode != 0:
+                    logger.warning(f"PDF extraction failed, skipping: {path}")
+                    if not (_read_meta(digest) or {}).get("error"):
+                        _defer_retry(digest, str(path))
+                results[path] = _cached_pages(digest, max_pages) or []
+            del running[path]
+
+    return results
+
+
+def extract_pdf_pages(path: Path, max_pages: Optional[int] = None, timeout: float = PDF_TIMEOUT_SECONDS) -> List[str]:
+    """Page text for a single PDF, isolated in a worker unless already cached"""
+    return extract_pdfs([path], max_pages=max_pages, workers=1, timeout=timeout)[Path(path)]
@@ -0,0 +1,178 @@
+"""Stage timers, counters and latency histograms for batch jobs such as ingestion.
+
+Histograms use fixed millisecond buckets so reports from separate runs or
+worker processes can be merged by adding bucket counts.
+"""
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if value_ms <= bound), len(BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bucket bound containing the given fraction of observations"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(float(BUCKETS_MS[index]), self.max_ms) if index < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_s": round(self.total_ms / 1000, 3),
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max_ms, 2),
+            "buckets_ms": BUCKETS_MS,
+            "bucket_counts": self.counts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        histogram = cls()
+        histogram.counts = list(data["bucket_counts"])
+        histogram.count = data["count"]
+        histogram.total_ms = data["total_s"] * 1000
+        histogram.max_ms = data["max_ms"]
+        return histogram
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+
+class RunMetrics:
+    """Collects per-stage timings and counters and renders a JSON run report"""
+
+    def __init__(self, name: str, show_progress: bool = False):
+        self.name = name
+        self.show_progress = show_progress
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.monotonic()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def observe(self, stage: str, value_ms: float) -> None:
+        self.stages.setdefault(stage, Histogram()).observe(value_ms)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def progress(self, done: int, total: int, label: str = "files") -> None:
+        """Rewrite a single stderr status line with rate and ETA"""
+        if not self.show_progress or not total:
+            return
+        elapsed = self.elapsed()
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = (total - done) / rate if rate > 0 else 0.0
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining))
+        line = (
+            f"\r[{done}/{total} {label}] {done / total:5.1%} "
+            f"{rate:.2f} {label}/s, {self.counters.get('docs_uploaded', 0)} docs, ETA {eta}"
+        )
+        sys.stderr.write(line)
+        if done >= total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = self.elapsed()
+        throughput = {
+            f"{name}_per_s": round(value / elapsed, 3) if elapsed > 0 else 0.0
+            for name, value in self.counters.items()
+        }
+        return {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "wall_time_s": round(elapsed, 3),
+            "counters": dict(sorted(self.counters.items())),
+            "throughput": dict(sorted(throughput.items())),
+            "stages": {name: hist.to_dict() for name, hist in sorted(self.stages.items())},
+        }
+
+    def write_report(self, path: Optional[Path]) -> Dict[str, Any]:
+        report = self.report()
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        return report
+
+
+def merge_reports(name: str, reports: List[Dict[str, Any]], wall_time_s: float) -> Dict[str, Any]:
+    """Combine reports from parallel workers into one report for the whole run.
+
+    Counters and histogram buckets are summed; throughput is recomputed over
+    the coordinator's wall time so it reflects the combined rate.
+    """
+    counters: Dict[str, int] = {}
+    stages: Dict[str, Histogram] = {}
+    for report in reports:
+        for key, value in report["counters"].items():
+            counters[key] = counters.get(key, 0) + value
+        for stage, data in report["stages"].items():
+            stages.setdefault(stage, Histogram()).merge(Histogram.from_dict(data))
+
+    return {
+        "run": name,
+        "started_at": min((r["started_at"] for r in reports), default=None),
+        "finished_at": max((r["finished_at"] for r in reports), default=None),
+        "wall_time_s": round(wall_time_s, 3),
+        "workers": [{"run": r["run"], "wall_time_s": r["wall_time_s"]} for r in reports],
+        "counters": dict(sorted(counters.items())),
+        "throughput": {
+            f"{key}_per_s": round(value / wall_time_s, 3) if wall_time_s > 0 else 0.0
+            for key, value in sorted(counters.items())
+        },
+        "stages": {stage: hist.to_dict() for stage, hist in sorted(stages.items())},
+    }
+
+
+def stage_summary(report: Dict[str, Any]) -> List[str]:
+    """One line per stage, slowest total first, for console output"""
+    stages = sorted(report["stages"].items(), key=lambda item: item[1]["total_s"], reverse=True)
+    return [
+        f"{name:<14} {data['total_s']:>9.2f}s  n={data['count']:<6} p50={data['p50_ms']:.0f}ms p95={data['p95_ms']:.0f}ms"
+        for name, data in stages
+    ]
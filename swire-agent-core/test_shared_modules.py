@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Check the modules vendored into the knowledge base match their originals here"""
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+KNOWLEDGE_BASE = ROOT.parent / "swire-copilot-assistant" / "knowledge-base"
+
+SHARED_MODULES = [
+    "src/utils/keyword_classifier.py",
+    "src/utils/search_cache.py",
+]
+
+
+def test_shared_modules():
+    if not KNOWLEDGE_BASE.is_dir():
+        print("- Knowledge base tree not present, nothing to compare")
+        return
+
+    ok = True
+    for module in SHARED_MODULES:
+        original = ROOT / module
+        copy = KNOWLEDGE_BASE / original.name
+        if copy.read_bytes() == original.read_bytes():
+            print(f"✓ {copy.name} matches {module}")
+        else:
+            print(f"✗ {copy.name} differs from {module}; copy {module} over it")
+            ok = False
+    assert ok, "vendored modules are out of date"
+
+
+if __name__ == "__main__":
+    test_shared_modules()
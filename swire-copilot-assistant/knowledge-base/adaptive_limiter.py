@@ -0,0 +1,103 @@
+"""
+Adaptive concurrency limiter for the Swire knowledge base pipeline
+Grows or shrinks in-flight requests per downstream service using AIMD
+(additive increase, multiplicative decrease)
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one downstream service.
+
+    Each healthy completion adds 1/limit to the limit, so it grows by about
+    one slot per full window of requests while latency stays within
+    latency_tolerance times the best observed latency. A 429, 5xx or timeout
+    multiplies the limit by backoff, at most once per cooldown period so a
+    burst of failures from the same window counts once.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 5,
+        minimum: int = 1,
+        maximum: int = 20,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 1.0,
+    ):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+        self._latency_ewma: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @staticmethod
+    def _is_congestion(error: BaseException) -> bool:
+        if isinstance(error, asyncio.TimeoutError):
+            return True
+        status = getattr(error, "status_code", None)
+        return status == 429 or (isinstance(status, int) and status >= 500)
+
+    def _record(self, latency: float, error: Optional[BaseException]):
+        if error is not None:
+            if not self._is_congestion(error):
+                self.errors += 1
+                return
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit * self.backoff)
+                self._last_decrease = now
+            return
+
+        self.successes += 1
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        self._best_latency = self._latency_ewma if self._best_latency is None else min(self._best_latency, self._latency_ewma)
+
+        if self._latency_ewma <= self._best_latency * self.latency_tolerance:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one in-flight slot for the duration of a downstream call"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+        started = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._record(time.monotonic() - started, error)
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "latency_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+        }
@@ -0,0 +1,234 @@
+"""
+Offline benchmark for the Swire knowledge base SharePoint sync
+Syncs a synthetic tenant end to end through sharepoint-connector.py and
+document-processor.py against the local services in fake_services.py, then
+reports throughput so concurrency and batching can be tuned without network
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fake_services import FakeServices, FakeTenant, ServiceBehaviour
+
+HERE = Path(__file__).resolve().parent
+
+
+def load_pipeline_module(name: str, filename: str):
+    """Import one of the hyphenated pipeline scripts under an importable name"""
+    spec = importlib.util.spec_from_file_location(name, HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the SharePoint to search index sync against local fakes")
+    tenant = parser.add_argument_group("synthetic tenant")
+    tenant.add_argument("--documents", type=int, default=500, help="Documents in the tenant")
+    tenant.add_argument("--sites", type=int, default=3)
+    tenant.add_argument("--libraries", type=int, default=2, help="Document libraries per site")
+    tenant.add_argument("--folders", type=int, default=4, help="Folders per library, nested at random")
+    tenant.add_argument("--duplicate-ratio", type=float, default=0.1, help="Share of documents that copy another's bytes")
+    tenant.add_argument("--mean-size", type=int, default=20000, help="Mean document size in bytes")
+    tenant.add_argument("--change-ratio", type=float, default=0.1, help="Share edited before an incremental second sync; 0 skips it")
+    tenant.add_argument("--delete-ratio", type=float, default=0.02, help="Share deleted before the incremental sync")
+    tenant.add_argument("--seed", type=int, default=0)
+
+    services = parser.add_argument_group("service behaviour (seconds per call)")
+    services.add_argument("--graph-latency", type=float, default=0.05)
+    services.add_argument("--blob-latency", type=float, default=0.01)
+    services.add_argument("--search-latency", type=float, default=0.03)
+    services.add_argument("--form-recognizer-latency", type=float, default=0.5)
+    services.add_argument("--openai-latency", type=float, default=0.2)
+    services.add_argument("--jitter", type=float, default=0.5, help="Extra random latency, as a fraction of each latency")
+    services.add_argument("--transfer-seconds-per-mb", type=float, default=0.02, help="Graph and blob transfer cost")
+    services.add_argument("--error-rate", type=float, default=0.0, help="Chance of an injected 503 per call")
+    services.add_argument("--throttle-rate", type=float, default=0.0, help="Chance of an injected 429 per call")
+    services.add_argument("--form-recognizer-capacity", type=int, default=15, help="Concurrent analyses before 429s; 0 for no limit")
+    services.add_argument("--openai-capacity", type=int, default=20, help="Concurrent OpenAI calls before 429s; 0 for no limit")
+    services.add_argument(
+        "--azurite", metavar="CONNECTION_STRING",
+        help="Use a real Azurite blob endpoint instead of the in-memory store, e.g. UseDevelopmentStorage=true"
+    )
+
+    tuning = parser.add_argument_group("pipeline settings (default: environment, as in production)")
+    for option in ("site", "document", "graph", "blob"):
+        tuning.add_argument(f"--{option}-concurrency", type=int)
+    tuning.add_argument("--batch-concurrency", type=int, help="Initial adaptive limit per processor service")
+    tuning.add_argument("--batch-max-concurrency", type=int, help="Maximum adaptive limit per processor service")
+
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's INFO logging")
+    return parser.parse_args()
+
+
+def build_behaviours(args: argparse.Namespace) -> Dict[str, ServiceBehaviour]:
+    latencies = {
+        "graph": args.graph_latency,
+        "blob": args.blob_latency,
+        "search": args.search_latency,
+        "form_recognizer": args.form_recognizer_latency,
+        "openai": args.openai_latency,
+    }
+    capacities = {"form_recognizer": args.form_recognizer_capacity, "openai": args.openai_capacity}
+    return {
+        service: ServiceBehaviour(
+            service,
+            latency=latency,
+            jitter=latency * args.jitter,
+            seconds_per_mb=args.transfer_seconds_per_mb if service in ("graph", "blob") else 0.0,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            capacity=capacities.get(service) or None,
+            seed=args.seed,
+        )
+        for service, latency in latencies.items()
+    }
+
+
+async def timed_sync(connector: Any, services: FakeServices, site_urls: List[str]) -> Dict[str, Any]:
+    """Run one sync of every site and summarise its throughput and service usage"""
+    services.reset_stats()
+    started = time.perf_counter()
+    result = await connector.sync_sharepoint_sites(site_urls)
+    elapsed = time.perf_counter() - started
+
+    downloaded = services.behaviours["graph"].bytes / (1024 * 1024)
+    return {
+        "seconds": round(elapsed, 2),
+        "documents_synced": result["documents_synced"],
+        "documents_failed": result["documents_failed"],
+        "documents_deleted": result["documents_deleted"],
+        "documents_per_second": round(result["documents_synced"] / elapsed, 2) if elapsed else None,
+        "downloaded_mb_per_second": round(downloaded / elapsed, 2) if elapsed else None,
+        "site_errors": [error for error in result["errors"] if "site" in error],
+        "services": services.stats(),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    processor_module = load_pipeline_module("document_processor", "document-processor.py")
+    connector_module = load_pipeline_module("sharepoint_connector", "sharepoint-connector.py")
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        for module in (processor_module, connector_module):
+            module.logger.setLevel(logging.WARNING)
+
+    tenant = FakeTenant.generate(
+        args.documents, args.sites, args.libraries, args.folders, args.duplicate_ratio, args.mean_size, args.seed
+    )
+
+    blob_service = None
+    if args.azurite:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob.aio import BlobServiceClient
+        blob_service = BlobServiceClient.from_connection_string(args.azurite)
+        try:
+            await blob_service.create_container("documents")
+        except ResourceExistsError:
+            pass
+
+    with tempfile.TemporaryDirectory(prefix="kb-benchmark-") as work:
+        config = connector_module.load_sharepoint_config()
+        config.update({
+            "storage_account": "devstoreaccount1",
+            "cache_path": str(Path(work) / "kb_cache.sqlite"),
+            "sync_state_path": str(Path(work) / "sharepoint_sync.sqlite"),
+            "sharepoint_sites": tenant.site_urls(),
+        })
+        for option in ("site", "document", "graph", "blob", "batch"):
+            value = getattr(args, f"{option}_concurrency")
+            if value:
+                config[f"{option}_concurrency"] = value
+        if args.batch_max_concurrency:
+            config["batch_max_concurrency"] = args.batch_max_concurrency
+
+        processor = processor_module.DocumentProcessor(config)
+        connector = connector_module.SharePointConnector(config)
+        services = FakeServices(tenant, build_behaviours(args), blob_service)
+        services.attach_connector(connector, processor)
+
+        report: Dict[str, Any] = {
+            "tenant": tenant.stats(),
+            "settings": {
+                "site_concurrency": connector.site_concurrency,
+                "document_concurrency": connector.document_concurrency,
+                "graph_concurrency": connector.graph_concurrency,
+                "batch_concurrency": processor.batch_concurrency,
+                "batch_max_concurrency": processor.max_concurrency,
+            },
+        }
+        try:
+            report["initial_sync"] = await timed_sync(connector, services, tenant.site_urls())
+
+            if args.change_ratio or args.delete_ratio:
+                report["mutations"] = tenant.mutate(args.change_ratio, args.delete_ratio, args.seed)
+                report["incremental_sync"] = await timed_sync(connector, services, tenant.site_urls())
+
+            report["limiters"] = processor.get_concurrency_stats()
+            report["caches"] = processor.get_cache_stats()
+        finally:
+            await connector.close()
+
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    tenant = report["tenant"]
+    print(
+        f"Tenant: {tenant['documents']} documents ({tenant['unique_documents']} unique, {tenant['megabytes']} MB) "
+        f"in {tenant['sites']} sites / {tenant['libraries']} libraries"
+    )
+    print("Settings: " + ", ".join(f"{key}={value}" for key, value in report["settings"].items()))
+
+    for phase in ("initial_sync", "incremental_sync"):
+        if phase not in report:
+            continue
+        result = report[phase]
+        title = phase.replace("_", " ").capitalize()
+        if phase == "incremental_sync":
+            mutations = report["mutations"]
+            title += f" after {mutations['changed']} edits and {mutations['deleted']} deletes"
+        print(f"\n{title}: {result['seconds']}s")
+        print(
+            f"  {result['documents_synced']} synced, {result['documents_failed']} failed, "
+            f"{result['documents_deleted']} deleted; {result['documents_per_second']} docs/s, "
+            f"{result['downloaded_mb_per_second']} MB/s downloaded"
+        )
+        for error in result["site_errors"]:
+            print(f"  site error {error['site']}: {error['error']}")
+        for service, stats in result["services"].items():
+            extra = "".join(
+                f", {key}={value}" for key, value in stats.items()
+                if key not in ("calls", "throttled", "failed", "peak_in_flight", "megabytes")
+            )
+            print(
+                f"  {service:<16} {stats['calls']:>6} calls, {stats['throttled']} throttled, {stats['failed']} failed, "
+                f"peak {stats['peak_in_flight']} in flight{extra}"
+            )
+
+    print("\nAdaptive limits:")
+    for service, stats in report["limiters"].items():
+        print(f"  {service:<16} " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,20 @@ Handles document ingestion, processing, and indexing for Azure Cognitive Search
 """
 
 import os
+import copy
 import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import tempfile
+from typing import BinaryIO, List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import asyncio
 from pathlib import Path
 
 import aiohttp
 import aiofiles
+import httpx
+from azure.core.pipeline.transport import AioHttpTransport
 from azure.storage.blob.aio import BlobServiceClient
 from azure.search.documents.aio import SearchClient
 from azure.search.documents.indexes.aio import SearchIndexClient
@@ -23,60 +28,175 @@ from azure.identity.aio import DefaultAzureCredential
 import openai
 from openai import AsyncAzureOpenAI
 
+from adaptive_limiter import AdaptiveLimiter
+from kb_cache import LayoutCache, TagCache
+from keyword_classifier import KeywordClassifier
+from search_cache import IndexGeneration, SearchResultCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Chunking and batching limits for indexing
+CHUNK_SIZE = 2000  # characters per indexed chunk
+CHUNK_OVERLAP = 200  # characters carried into the next chunk
+EMBEDDING_BATCH_SIZE = 16  # inputs per embeddings request
+INDEX_BATCH_SIZE = 100  # documents per upload_documents call
+EMBEDDING_DIMENSIONS = 1536
+
+# Connections kept per service beyond the maximum concurrency, for searches and polling
+POOL_HEADROOM = 4
+
+# Blob downloads stream in chunks into a temp file that spills to disk above the threshold
+BLOB_DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Fields returned per search hit; full content is fetched on demand
+SEARCH_SELECT_FIELDS = [
+    "id", "parentId", "pageStart", "pageEnd", "title", "source", "locations", "department", "documentType", "tags"
+]
+
+# Form Recognizer model used for text extraction; part of the layout cache key
+FORM_RECOGNIZER_MODEL = "prebuilt-read"
+
+# Tag generation: bump the prompt version whenever the tagging prompt changes
+TAG_PROMPT_VERSION = "tags-v2"
+TAG_PREFIX_CHARS = 2000  # characters of each document sent for tagging
+TAG_BATCH_SIZE = 8  # documents per tagging request
+TAG_BATCH_WINDOW = 0.05  # seconds to wait for more documents before tagging a partial batch
+DEFAULT_TAGS = ["document", "general"]
+
+# Metadata keyword sets; where several categories hit, the first listed wins
+PATH_KEYWORDS = KeywordClassifier({
+    "Finance": ['finance', 'accounting', 'budget'],
+    "HSE": ['hse', 'safety', 'health', 'environment'],
+    "HR": ['hr', 'human-resources', 'personnel'],
+    "Operations": ['operations', 'maintenance', 'technical'],
+    "Legal": ['legal', 'compliance', 'governance']
+})
+FILE_NAME_KEYWORDS = KeywordClassifier({
+    "policy": ['policy', 'policies'],
+    "procedure": ['procedure', 'process', 'sop'],
+    "manual": ['manual', 'guide', 'handbook'],
+    "report": ['report', 'analysis', 'summary'],
+    "form": ['form', 'template', 'checklist']
+})
+CONTENT_KEYWORDS = KeywordClassifier({
+    "department:Finance": ['revenue', 'expense', 'budget', 'financial'],
+    "department:HSE": ['incident', 'safety', 'environmental', 'hazard'],
+    "department:HR": ['employee', 'personnel', 'training', 'performance'],
+    "department:Operations": ['procedure', 'maintenance', 'operation', 'technical'],
+    "type:policy": ['policy statement', 'this policy'],
+    "type:procedure": ['step 1', 'procedure', 'instructions'],
+    "type:report": ['report'],
+    "type:report_detail": ['summary', 'findings', 'analysis'],
+    "access:confidential": ['confidential', 'restricted', 'internal only', 'proprietary'],
+    "access:restricted": ['sensitive', 'private', 'limited access']
+})
+
+# Downstream services that get their own adaptive concurrency limit
+LIMITED_SERVICES = ("blob", "form_recognizer", "openai", "search")
+
 class DocumentProcessor:
     """Processes documents for the Swire Intelligence Assistant knowledge base"""
     
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        self.batch_concurrency = int(config.get("batch_concurrency") or 5)
+        self.max_concurrency = max(self.batch_concurrency, int(config.get("batch_max_concurrency") or 20))
+        self.limiters = {
+            service: AdaptiveLimiter(service, initial=self.batch_concurrency, maximum=self.max_concurrency)
+            for service in LIMITED_SERVICES
+        }
+        cache_path = Path(config.get("cache_path") or ".cache/kb_cache.sqlite")
+        self.layout_cache = LayoutCache(cache_path, max_bytes=int(config.get("layout_cache_mb") or 512) * 1024 * 1024)
+        self.tag_cache = TagCache(cache_path)
+        self.index_generation = IndexGeneration(cache_path, config.get("search_index") or "swire-knowledge-base")
+        self.search_cache = SearchResultCache(
+            ttl_seconds=float(config.get("search_cache_ttl") or 0),
+            max_entries=int(config.get("search_cache_size") or 0),
+            generation=self.index_generation.current
+        )
+        self._pending_tags: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._tag_flush_task: Optional[asyncio.Task] = None
+        self.credential = None
         self.blob_client = None
         self.search_client = None
         self.form_recognizer_client = None
         self.openai_client = None
+        self._sessions: List[aiohttp.ClientSession] = []
         
+    def _pooled_transport(self, pool_size: int) -> AioHttpTransport:
+        """Create a keep-alive connection pool owned by this processor, not the client"""
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size, keepalive_timeout=60)
+        )
+        self._sessions.append(session)
+        return AioHttpTransport(session=session, session_owner=False)
+
     async def initialize(self):
-        """Initialize Azure clients"""
+        """Initialize long-lived Azure clients, one pooled transport per service.
+        
+        Clients stay open until close(); callers must not use them as async
+        context managers, which would close the shared connection pool.
+        """
+        if self.search_client:
+            return
+        
         try:
+            pool_size = self.max_concurrency + POOL_HEADROOM
+            
             # Initialize Azure clients with managed identity
-            credential = DefaultAzureCredential()
+            self.credential = DefaultAzureCredential()
             
             # Blob Storage client
             self.blob_client = BlobServiceClient(
                 account_url=f"https://{self.config['storage_account']}.blob.core.windows.net",
-                credential=credential
+                credential=self.credential,
+                transport=self._pooled_transport(pool_size),
+                max_single_get_size=BLOB_DOWNLOAD_CHUNK_SIZE,
+                max_chunk_get_size=BLOB_DOWNLOAD_CHUNK_SIZE
             )
             
             # Cognitive Search client
             self.search_client = SearchClient(
                 endpoint=self.config['search_endpoint'],
                 index_name=self.config['search_index'],
-                credential=credential
+                credential=self.credential,
+                transport=self._pooled_transport(pool_size)
             )
             
             # Form Recognizer client
             self.form_recognizer_client = DocumentAnalysisClient(
                 endpoint=self.config['form_recognizer_endpoint'],
-                credential=credential
+                credential=self.credential,
+                transport=self._pooled_transport(pool_size)
             )
             
             # Azure OpenAI client
             self.openai_client = AsyncAzureOpenAI(
                 azure_endpoint=self.config['openai_endpoint'],
                 api_key=self.config['openai_api_key'],
-                api_version=self.config['openai_api_version']
+                api_version=self.config['openai_api_version'],
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    timeout=httpx.Timeout(60.0)
+                )
             )
             
-            logger.info("Successfully initialized all Azure clients")
+            logger.info(f"Successfully initialized all Azure clients (pool size {pool_size})")
             
         except Exception as e:
             logger.error(f"Failed to initialize clients: {str(e)}")
             raise
 
-    async def process_document(self, blob_name: str, container_name: str = "documents") -> Dict[str, Any]:
-        """Process a single document from blob storage"""
+    async def process_document(
+        self, blob_name: str, container_name: str = "documents", document_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Process a single document from blob storage.
+        
+        Chunks are indexed under document_id, by default derived from the blob name.
+        """
         try:
             logger.info(f"Processing document: {blob_name}")
             
@@ -86,67 +206,164 @@ class DocumentProcessor:
                 blob=blob_name
             )
             
-            async with blob_client:
-                blob_data = await blob_client.download_blob()
-                content = await blob_data.readall()
+            # Reuse a cached analysis when the blob's ETag has not changed
+            async with self.limiters["blob"].slot():
+                properties = await blob_client.get_blob_properties()
+            version = (properties.etag or "").strip('"')
+            pages = self.layout_cache.get(blob_name, version, FORM_RECOGNIZER_MODEL) if version else None
+            
+            if pages is None:
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as stream:
+                    content_hash = await self._download_to_stream(blob_client, stream)
+                    
+                    # Without an ETag, fall back to keying on the content hash
+                    if not version:
+                        version = content_hash
+                        pages = self.layout_cache.get(blob_name, version, FORM_RECOGNIZER_MODEL)
+                    
+                    # Extract text using Form Recognizer, keeping page boundaries
+                    if pages is None:
+                        pages = await self._extract_pages_with_form_recognizer(stream, blob_name, version)
+            else:
+                logger.info(f"Using cached Form Recognizer layout for {blob_name}")
             
-            # Extract text using Form Recognizer
-            extracted_text = await self._extract_text_with_form_recognizer(content)
+            extracted_text = "\n".join(line for page in pages for line in page["lines"]).strip()
             
             # Generate metadata
             metadata = await self._generate_metadata(blob_name, extracted_text)
             
-            # Create embeddings
-            embeddings = await self._create_embeddings(extracted_text)
-            
-            # Prepare document for indexing
-            document = {
-                "id": self._generate_document_id(blob_name),
-                "title": metadata["title"],
-                "content": extracted_text,
-                "source": metadata["source"],
-                "department": metadata["department"],
-                "documentType": metadata["document_type"],
-                "lastModified": metadata["last_modified"],
-                "accessLevel": metadata["access_level"],
-                "tags": metadata["tags"],
-                "contentVector": embeddings
-            }
+            # Split into chunks and embed them in batches
+            chunks = self._chunk_pages(pages)
+            embeddings = await self._create_embeddings_batch([chunk["content"] for chunk in chunks])
+            
+            # Prepare one search document per chunk, linked by parent id
+            parent_id = document_id or self._generate_document_id(blob_name)
+            documents = []
+            for chunk, vector in zip(chunks, embeddings):
+                documents.append({
+                    "id": f"{parent_id}_{chunk['chunk']}",
+                    "parentId": parent_id,
+                    "chunk": chunk["chunk"],
+                    "pageStart": chunk["page_start"],
+                    "pageEnd": chunk["page_end"],
+                    "title": metadata["title"],
+                    "content": chunk["content"],
+                    "source": metadata["source"],
+                    "locations": [blob_name],
+                    "department": metadata["department"],
+                    "documentType": metadata["document_type"],
+                    "lastModified": metadata["last_modified"],
+                    "accessLevel": metadata["access_level"],
+                    "tags": metadata["tags"],
+                    "contentVector": vector
+                })
             
-            # Index document
-            await self._index_document(document)
+            # Index chunks and drop any left over from a longer previous version
+            await self._index_chunks(parent_id, documents)
             
-            logger.info(f"Successfully processed document: {blob_name}")
-            return {"status": "success", "document_id": document["id"]}
+            logger.info(f"Successfully processed document: {blob_name} ({len(documents)} chunks)")
+            return {
+                "status": "success",
+                "document_id": parent_id,
+                "chunks": len(documents),
+                "document_ids": [document["id"] for document in documents]
+            }
             
         except Exception as e:
             logger.error(f"Failed to process document {blob_name}: {str(e)}")
             return {"status": "error", "error": str(e)}
 
-    async def _extract_text_with_form_recognizer(self, content: bytes) -> str:
-        """Extract text from document using Azure Form Recognizer"""
+    async def _download_to_stream(self, blob_client, stream: BinaryIO) -> str:
+        """Stream a blob into a file object chunk by chunk and return its sha256.
+        
+        At most one BLOB_DOWNLOAD_CHUNK_SIZE chunk is held in memory; the
+        stream is rewound ready for reading.
+        """
+        digest = hashlib.sha256()
+        async with self.limiters["blob"].slot():
+            downloader = await blob_client.download_blob(max_concurrency=1)
+            async for chunk in downloader.chunks():
+                digest.update(chunk)
+                stream.write(chunk)
+        stream.seek(0)
+        return digest.hexdigest()
+
+    async def _extract_pages_with_form_recognizer(self, stream: BinaryIO, blob_name: str, version: str) -> List[Dict[str, Any]]:
+        """Extract text lines per page from document using Azure Form Recognizer.
+        
+        Successful analyses are stored in the layout cache under
+        (blob_name, version, model); fallback text is never cached.
+        """
         try:
-            async with self.form_recognizer_client:
+            async with self.limiters["form_recognizer"].slot():
                 poller = await self.form_recognizer_client.begin_analyze_document(
-                    "prebuilt-read", content
+                    FORM_RECOGNIZER_MODEL, stream
                 )
                 result = await poller.result()
             
-            # Combine all text content
-            extracted_text = ""
-            for page in result.pages:
-                for line in page.lines:
-                    extracted_text += line.content + "\n"
-            
-            return extracted_text.strip()
+            pages = [
+                {
+                    "page_number": page.page_number,
+                    "lines": [line.content for line in page.lines],
+                    "spans": [
+                        (line.spans[0].offset, line.spans[0].length) if line.spans else (None, None)
+                        for line in page.lines
+                    ]
+                }
+                for page in result.pages
+            ]
+            self.layout_cache.put(blob_name, version, FORM_RECOGNIZER_MODEL, pages)
+            return pages
             
         except Exception as e:
             logger.error(f"Form Recognizer extraction failed: {str(e)}")
             # Fallback to basic text extraction if available
             try:
-                return content.decode('utf-8', errors='ignore')
+                stream.seek(0)
+                lines = [line.decode('utf-8', errors='ignore').rstrip("\r\n") for line in stream]
             except:
-                return "Unable to extract text from document"
+                lines = ["Unable to extract text from document"]
+            return [{"page_number": 1, "lines": lines}]
+
+    def _chunk_pages(self, pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Split page lines into overlapping chunks that record their page span"""
+        chunks = []
+        current: List[tuple] = []  # (page_number, line)
+        size = 0
+        
+        def flush():
+            text = "\n".join(line for _, line in current).strip()
+            if text:
+                chunks.append({
+                    "chunk": len(chunks),
+                    "content": text,
+                    "page_start": current[0][0],
+                    "page_end": current[-1][0]
+                })
+        
+        for page in pages:
+            for line in page["lines"]:
+                # Hard-split single lines longer than a chunk
+                pieces = [line[i:i + CHUNK_SIZE] for i in range(0, len(line), CHUNK_SIZE)] or [""]
+                for piece in pieces:
+                    if current and size + len(piece) + 1 > CHUNK_SIZE:
+                        flush()
+                        # Carry trailing lines forward as overlap
+                        overlap, overlap_size = [], 0
+                        for entry in reversed(current):
+                            if overlap_size + len(entry[1]) + 1 > CHUNK_OVERLAP:
+                                break
+                            overlap.insert(0, entry)
+                            overlap_size += len(entry[1]) + 1
+                        if overlap_size + len(piece) + 1 > CHUNK_SIZE:
+                            overlap, overlap_size = [], 0
+                        current, size = overlap, overlap_size
+                    current.append((page["page_number"], piece))
+                    size += len(piece) + 1
+        
+        if current:
+            flush()
+        return chunks
 
     async def _generate_metadata(self, blob_name: str, content: str) -> Dict[str, Any]:
         """Generate metadata for the document"""
@@ -156,17 +373,20 @@ class DocumentProcessor:
             file_name = Path(blob_name).stem
             file_extension = Path(blob_name).suffix.lower()
             
+            # Score the content once for department, document type and access level
+            content_hits = CONTENT_KEYWORDS.counts(content)
+            
             # Determine department from path or content
-            department = self._determine_department(blob_name, content)
+            department = self._determine_department(blob_name, content_hits)
             
             # Determine document type
-            document_type = self._determine_document_type(file_name, content, file_extension)
+            document_type = self._determine_document_type(file_name, content_hits, file_extension)
             
             # Generate tags using AI
             tags = await self._generate_tags(content)
             
             # Determine access level
-            access_level = self._determine_access_level(content, department)
+            access_level = self._determine_access_level(content_hits, department)
             
             return {
                 "title": file_name.replace("_", " ").replace("-", " ").title(),
@@ -182,106 +402,183 @@ class DocumentProcessor:
             logger.error(f"Metadata generation failed: {str(e)}")
             return self._get_default_metadata(blob_name)
 
-    def _determine_department(self, blob_name: str, content: str) -> str:
-        """Determine department based on file path and content"""
-        blob_lower = blob_name.lower()
-        content_lower = content.lower()
-        
+    def _determine_department(self, blob_name: str, content_hits: Dict[str, int]) -> str:
+        """Determine department based on file path and content keyword hits"""
         # Check path-based indicators
-        if any(dept in blob_lower for dept in ['finance', 'accounting', 'budget']):
-            return "Finance"
-        elif any(dept in blob_lower for dept in ['hse', 'safety', 'health', 'environment']):
-            return "HSE"
-        elif any(dept in blob_lower for dept in ['hr', 'human-resources', 'personnel']):
-            return "HR"
-        elif any(dept in blob_lower for dept in ['operations', 'maintenance', 'technical']):
-            return "Operations"
-        elif any(dept in blob_lower for dept in ['legal', 'compliance', 'governance']):
-            return "Legal"
+        path_matches = PATH_KEYWORDS.matches(blob_name)
+        if path_matches:
+            return path_matches[0]
         
         # Check content-based indicators
-        if any(keyword in content_lower for keyword in ['revenue', 'expense', 'budget', 'financial']):
-            return "Finance"
-        elif any(keyword in content_lower for keyword in ['incident', 'safety', 'environmental', 'hazard']):
-            return "HSE"
-        elif any(keyword in content_lower for keyword in ['employee', 'personnel', 'training', 'performance']):
-            return "HR"
-        elif any(keyword in content_lower for keyword in ['procedure', 'maintenance', 'operation', 'technical']):
-            return "Operations"
+        for category, hits in content_hits.items():
+            if hits and category.startswith("department:"):
+                return category.split(":", 1)[1]
         
         return "General"
 
-    def _determine_document_type(self, file_name: str, content: str, extension: str) -> str:
-        """Determine document type based on name, content, and extension"""
-        name_lower = file_name.lower()
-        content_lower = content.lower()
-        
+    def _determine_document_type(self, file_name: str, content_hits: Dict[str, int], extension: str) -> str:
+        """Determine document type based on name, content keyword hits, and extension"""
         # Check for specific document types
-        if any(keyword in name_lower for keyword in ['policy', 'policies']):
-            return "policy"
-        elif any(keyword in name_lower for keyword in ['procedure', 'process', 'sop']):
-            return "procedure"
-        elif any(keyword in name_lower for keyword in ['manual', 'guide', 'handbook']):
-            return "manual"
-        elif any(keyword in name_lower for keyword in ['report', 'analysis', 'summary']):
-            return "report"
-        elif any(keyword in name_lower for keyword in ['form', 'template', 'checklist']):
-            return "form"
+        name_matches = FILE_NAME_KEYWORDS.matches(file_name)
+        if name_matches:
+            return name_matches[0]
         
         # Check content indicators
-        if any(keyword in content_lower for keyword in ['policy statement', 'this policy']):
+        if content_hits["type:policy"]:
             return "policy"
-        elif any(keyword in content_lower for keyword in ['step 1', 'procedure', 'instructions']):
+        elif content_hits["type:procedure"]:
             return "procedure"
-        elif 'report' in content_lower and any(keyword in content_lower for keyword in ['summary', 'findings', 'analysis']):
+        elif content_hits["type:report"] and content_hits["type:report_detail"]:
             return "report"
         
         return "document"
 
     async def _generate_tags(self, content: str) -> List[str]:
-        """Generate tags using Azure OpenAI"""
+        """Generate tags using Azure OpenAI, memoised on the document prefix.
+        
+        Uncached documents are queued and tagged together: a batch is sent once
+        TAG_BATCH_SIZE documents are waiting or TAG_BATCH_WINDOW has passed, so
+        concurrent process_batch workers share chat calls.
+        """
+        prefix = content[:TAG_PREFIX_CHARS]
+        key = self.tag_cache.key(prefix, TAG_PROMPT_VERSION)
+        cached = self.tag_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Identical prefixes already waiting share one result
+        if key in self._pending_tags:
+            return await asyncio.shield(self._pending_tags[key][1])
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending_tags[key] = (prefix, future)
+        
+        if len(self._pending_tags) >= TAG_BATCH_SIZE:
+            pending, self._pending_tags = self._pending_tags, {}
+            # Shielded: the whole batch waits on this call, not just this caller
+            await asyncio.shield(self._tag_pending(pending))
+        elif self._tag_flush_task is None:
+            self._tag_flush_task = asyncio.create_task(self._flush_tags_after(TAG_BATCH_WINDOW))
+        
+        return await asyncio.shield(future)
+
+    async def _flush_tags_after(self, delay: float):
+        """Tag whatever is queued once the batching window closes"""
+        await asyncio.sleep(delay)
+        self._tag_flush_task = None
+        pending, self._pending_tags = self._pending_tags, {}
+        if pending:
+            await self._tag_pending(pending)
+
+    async def _tag_pending(self, pending: Dict[str, Tuple[str, asyncio.Future]]):
+        """Tag a batch of queued prefixes, cache the results and wake their callers"""
+        items = list(pending.items())
         try:
-            # Truncate content for API call
-            truncated_content = content[:2000] if len(content) > 2000 else content
-            
+            try:
+                tag_lists = await self._generate_tags_batch([prefix for _, (prefix, _) in items])
+            except Exception as e:
+                logger.error(f"Tag generation failed: {str(e)}")
+                tag_lists = [[] for _ in items]
+            
+            for (key, (_, future)), tags in zip(items, tag_lists):
+                if not future.done():
+                    future.set_result(tags or list(DEFAULT_TAGS))
+                # Fallback tags are not cached so the document is retried next time
+                if tags:
+                    try:
+                        self.tag_cache.put(key, tags)
+                    except Exception as e:
+                        logger.warning(f"Could not cache tags: {str(e)}")
+        finally:
+            # Cancellation or an unexpected error must not leave waiters hanging
+            for _, (_, future) in items:
+                if not future.done():
+                    future.set_result(list(DEFAULT_TAGS))
+
+    async def _generate_tags_batch(self, prefixes: List[str]) -> List[List[str]]:
+        """Tag several documents in one chat call that replies with a JSON object.
+        
+        JSON mode (response_format) is only requested when openai_json_mode is
+        set, as older deployments such as gpt-4 0613 reject it; otherwise the
+        object is read out of the plain reply.
+        """
+        documents = "\n\n".join(
+            f"### Document {index}\n{prefix}" for index, prefix in enumerate(prefixes)
+        )
+        
+        options = {"response_format": {"type": "json_object"}} if self.config.get("openai_json_mode") else {}
+        async with self.limiters["openai"].slot():
             response = await self.openai_client.chat.completions.create(
                 model=self.config['openai_deployment'],
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are a document analysis assistant. Generate 3-5 relevant tags for the given document content. Return only the tags as a comma-separated list."
+                        "content": (
+                            "You are a document analysis assistant. Generate 3-5 relevant tags for each "
+                            "numbered document. Respond with a JSON object of the form "
+                            '{"documents": [{"id": <document number>, "tags": ["tag", ...]}]} '
+                            "containing one entry per document."
+                        )
                     },
                     {
                         "role": "user",
-                        "content": f"Generate tags for this document:\n\n{truncated_content}"
+                        "content": f"Generate tags for these {len(prefixes)} documents:\n\n{documents}"
                     }
                 ],
-                max_tokens=100,
-                temperature=0.3
+                max_tokens=50 + 60 * len(prefixes),
+                temperature=0.3,
+                **options
             )
-            
-            tags_text = response.choices[0].message.content.strip()
-            tags = [tag.strip() for tag in tags_text.split(',')]
-            return tags[:5]  # Limit to 5 tags
-            
-        except Exception as e:
-            logger.error(f"Tag generation failed: {str(e)}")
-            return ["document", "general"]
-
-    def _determine_access_level(self, content: str, department: str) -> str:
-        """Determine access level based on content and department"""
-        content_lower = content.lower()
         
+        # Without JSON mode the object may come wrapped in prose or a code fence
+        reply = response.choices[0].message.content or ""
+        try:
+            entries = json.loads(reply[reply.find("{"):reply.rfind("}") + 1])["documents"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning(f"Unparseable tag response for {len(prefixes)} documents: {str(e)}")
+            return [[] for _ in prefixes]
+        
+        tag_lists: List[List[str]] = [[] for _ in prefixes]
+        for entry in entries:
+            try:
+                index = int(entry["id"])
+                tags = [str(tag).strip() for tag in entry["tags"] if str(tag).strip()]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= index < len(prefixes):
+                tag_lists[index] = tags[:5]  # Limit to 5 tags
+        return tag_lists
+
+    def _determine_access_level(self, content_hits: Dict[str, int], department: str) -> str:
+        """Determine access level based on content keyword hits and department"""
         # Check for confidential indicators
-        if any(keyword in content_lower for keyword in ['confidential', 'restricted', 'internal only', 'proprietary']):
+        if content_hits["access:confidential"]:
             return "confidential"
-        elif any(keyword in content_lower for keyword in ['sensitive', 'private', 'limited access']):
+        elif content_hits["access:restricted"]:
             return "restricted"
         elif department in ['Finance', 'HR', 'Legal']:
             return "restricted"
         else:
             return "public"
 
+    async def _create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for many chunks, EMBEDDING_BATCH_SIZE inputs per request"""
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+            try:
+                async with self.limiters["openai"].slot():
+                    response = await self.openai_client.embeddings.create(
+                        model=self.config['embedding_deployment'],
+                        input=batch
+                    )
+                vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+            except Exception as e:
+                logger.error(f"Batch embedding generation failed: {str(e)}")
+                # Return zero vectors as fallback
+                vectors.extend([0.0] * EMBEDDING_DIMENSIONS for _ in batch)
+        return vectors
+
     async def _create_embeddings(self, text: str) -> List[float]:
         """Create embeddings for the document text"""
         try:
@@ -290,32 +587,106 @@ class DocumentProcessor:
             if len(text) > max_tokens * 4:  # Rough character to token ratio
                 text = text[:max_tokens * 4]
             
-            response = await self.openai_client.embeddings.create(
-                model=self.config['embedding_deployment'],
-                input=text
-            )
+            async with self.limiters["openai"].slot():
+                response = await self.openai_client.embeddings.create(
+                    model=self.config['embedding_deployment'],
+                    input=text
+                )
             
             return response.data[0].embedding
             
         except Exception as e:
             logger.error(f"Embedding generation failed: {str(e)}")
             # Return zero vector as fallback
-            return [0.0] * 1536  # Standard embedding dimension
+            return [0.0] * EMBEDDING_DIMENSIONS
 
-    async def _index_document(self, document: Dict[str, Any]):
-        """Index document in Azure Cognitive Search"""
+    async def _index_chunks(self, parent_id: str, documents: List[Dict[str, Any]]):
+        """Index chunk documents in batches and remove chunks from an older, longer version"""
         try:
-            async with self.search_client:
-                result = await self.search_client.upload_documents([document])
-                
-            if result[0].succeeded:
-                logger.info(f"Successfully indexed document: {document['id']}")
-            else:
-                logger.error(f"Failed to index document: {result[0].error_message}")
+            for start in range(0, len(documents), INDEX_BATCH_SIZE):
+                async with self.limiters["search"].slot():
+                    results = await self.search_client.upload_documents(documents[start:start + INDEX_BATCH_SIZE])
+                for result in results:
+                    if not result.succeeded:
+                        logger.error(f"Failed to index document {result.key}: {result.error_message}")
+            
+            await self._delete_stale_chunks(parent_id, len(documents))
+            
+            logger.info(f"Indexed {len(documents)} chunks for document: {parent_id}")
                 
         except Exception as e:
             logger.error(f"Document indexing failed: {str(e)}")
             raise
+        finally:
+            # Even a partial upload changes what searches return
+            self.index_generation.bump()
+
+    async def _delete_stale_chunks(self, parent_id: str, chunk_count: int):
+        """Remove chunks numbered chunk_count and above for this parent"""
+        try:
+            # Documents indexed before chunking used the parent id as their key. The
+            # connector keys content by hash instead, so it removes the md5(blob name)
+            # documents of older syncs itself, when it migrates or replaces their blobs
+            stale = [{"id": parent_id}]
+            async with self.limiters["search"].slot():
+                results = await self.search_client.search(
+                    search_text="*",
+                    filter=f"parentId eq '{parent_id}' and chunk ge {chunk_count}",
+                    select=["id"]
+                )
+                async for result in results:
+                    stale.append({"id": result["id"]})
+            async with self.limiters["search"].slot():
+                await self.search_client.delete_documents(stale)
+            
+        except Exception as e:
+            logger.warning(f"Stale chunk cleanup failed for {parent_id}: {str(e)}")
+
+    async def delete_document(self, parent_id: str, document_ids: Optional[List[str]] = None):
+        """Remove a document's chunks from the index by key, in batches.
+        
+        Pass the chunk ids recorded at indexing time; without them the ids are
+        looked up with a parentId filter (no embedding or ranking).
+        """
+        if document_ids is None:
+            document_ids = await self.indexed_document_ids(parent_id)
+        
+        # Documents indexed before chunking used the parent id as their key
+        keys = [{"id": document_id} for document_id in dict.fromkeys([parent_id, *document_ids])]
+        try:
+            for start in range(0, len(keys), INDEX_BATCH_SIZE):
+                async with self.limiters["search"].slot():
+                    await self.search_client.delete_documents(keys[start:start + INDEX_BATCH_SIZE])
+        finally:
+            self.index_generation.bump()
+        
+        logger.info(f"Removed {len(keys)} index documents for {parent_id}")
+
+    async def indexed_document_ids(self, parent_id: str) -> List[str]:
+        """Ids of the chunks currently in the index under a parent id"""
+        document_ids = []
+        async with self.limiters["search"].slot():
+            results = await self.search_client.search(
+                search_text="*", filter=f"parentId eq '{parent_id}'", select=["id"]
+            )
+            async for result in results:
+                document_ids.append(result["id"])
+        return document_ids
+
+    async def set_locations(self, document_ids: List[str], locations: List[str]):
+        """Replace the source locations on a document's chunks, e.g. when the same
+        content is found in another library or one of its copies goes away"""
+        updates = [{"id": document_id, "locations": locations} for document_id in document_ids]
+        try:
+            for start in range(0, len(updates), INDEX_BATCH_SIZE):
+                async with self.limiters["search"].slot():
+                    await self.search_client.merge_documents(updates[start:start + INDEX_BATCH_SIZE])
+        finally:
+            self.index_generation.bump()
+
+    def document_id(self, blob_name: str) -> str:
+        """Parent id under which a blob's chunks are indexed"""
+        return self._generate_document_id(blob_name)
 
     def _generate_document_id(self, blob_name: str) -> str:
         """Generate unique document ID"""
@@ -342,8 +713,9 @@ class DocumentProcessor:
             "errors": []
         }
         
-        # Process documents concurrently with limited concurrency
-        semaphore = asyncio.Semaphore(5)  # Limit to 5 concurrent processes
+        # Process documents concurrently; this is only a ceiling, each
+        # service's adaptive limiter decides the actual concurrency
+        semaphore = asyncio.Semaphore(self.max_concurrency)
         
         async def process_with_semaphore(blob_name):
             async with semaphore:
@@ -368,10 +740,23 @@ class DocumentProcessor:
                     "error": result.get("error", "Unknown error")
                 })
         
+        results["concurrency"] = self.get_concurrency_stats()
         return results
 
     async def search_documents(self, query: str, filters: Optional[Dict[str, str]] = None, top: int = 5) -> List[Dict[str, Any]]:
-        """Search documents in the knowledge base"""
+        """Search documents in the knowledge base.
+        
+        Hits carry a server-side snippet (semantic caption, else highlighted
+        fragments) instead of the content field; pass a hit's id to
+        get_document_content to load the full chunk text when it is actually
+        needed. Results are plain JSON-serialisable data, cached until the TTL
+        expires or the index generation changes; callers get their own copy.
+        """
+        cache_key = self.search_cache.key(query, filters, top)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
         try:
             # Create vector query for semantic search
             query_embedding = await self._create_embeddings(query)
@@ -389,38 +774,75 @@ class DocumentProcessor:
                     filter_parts.append(f"{key} eq '{value}'")
                 filter_expr = " and ".join(filter_parts)
             
-            async with self.search_client:
+            documents = []
+            async with self.limiters["search"].slot():
                 results = await self.search_client.search(
                     search_text=query,
                     vector_queries=[vector_query],
-                    select=["id", "title", "content", "source", "department", "documentType", "tags"],
+                    select=SEARCH_SELECT_FIELDS,
                     top=top,
                     filter=filter_expr,
                     query_type="semantic",
-                    semantic_configuration_name="swire-semantic-config"
+                    semantic_configuration_name="swire-semantic-config",
+                    query_caption="extractive",
+                    highlight_fields="content"
                 )
                 
-                documents = []
                 async for result in results:
                     documents.append({
                         "id": result["id"],
+                        "parentId": result.get("parentId"),
+                        "pages": [result.get("pageStart"), result.get("pageEnd")],
                         "title": result["title"],
-                        "content": result["content"][:500] + "..." if len(result["content"]) > 500 else result["content"],
+                        "snippet": self._search_snippet(result),
                         "source": result["source"],
+                        "locations": result.get("locations") or [],
                         "department": result["department"],
                         "documentType": result["documentType"],
                         "tags": result["tags"],
                         "score": result.get("@search.score", 0)
                     })
-                
-                return documents
+            
+            self.search_cache.put(cache_key, copy.deepcopy(documents))
+            return documents
                 
         except Exception as e:
             logger.error(f"Document search failed: {str(e)}")
             return []
 
+    @staticmethod
+    def _search_snippet(result: Dict[str, Any]) -> str:
+        """Semantic caption for a hit, falling back to its content highlights"""
+        captions = result.get("@search.captions") or []
+        if captions:
+            return " ... ".join(caption.text for caption in captions if caption.text)
+        highlights = (result.get("@search.highlights") or {}).get("content") or []
+        return " ... ".join(highlights)
+
+    async def get_document_content(self, document_id: str) -> Optional[str]:
+        """Fetch the full content of one indexed chunk by id"""
+        try:
+            async with self.limiters["search"].slot():
+                document = await self.search_client.get_document(key=document_id, selected_fields=["content"])
+            return document.get("content")
+        except Exception as e:
+            logger.error(f"Content fetch failed for {document_id}: {str(e)}")
+            return None
+
+    def get_concurrency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Current adaptive limit, in-flight count and outcomes per downstream service"""
+        return {service: limiter.stats() for service, limiter in self.limiters.items()}
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Size and hit counts of the local result caches"""
+        return {
+            "form_recognizer_layouts": self.layout_cache.stats(),
+            "tags": self.tag_cache.stats(),
+            "search_results": self.search_cache.stats()
+        }
+
     async def close(self):
-        """Close all clients"""
+        """Close all clients, then the connection pools and credential they share"""
         try:
             if self.blob_client:
                 await self.blob_client.close()
@@ -430,8 +852,19 @@ class DocumentProcessor:
                 await self.form_recognizer_client.close()
             if self.openai_client:
                 await self.openai_client.close()
+            for session in self._sessions:
+                await session.close()
+            if self.credential:
+                await self.credential.close()
         except Exception as e:
             logger.error(f"Error closing clients: {str(e)}")
+        finally:
+            self._sessions = []
+            self.blob_client = None
+            self.search_client = None
+            self.form_recognizer_client = None
+            self.openai_client = None
+            self.credential = None
 
 
 # Configuration loader
@@ -446,7 +879,14 @@ def load_config() -> Dict[str, Any]:
         "openai_api_key": os.getenv("OPENAI_API_KEY"),
         "openai_api_version": os.getenv("OPENAI_API_VERSION", "2023-12-01-preview"),
         "openai_deployment": os.getenv("OPENAI_GPT4_DEPLOYMENT", "gpt-4"),
-        "embedding_deployment": os.getenv("OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
+        "openai_json_mode": os.getenv("OPENAI_JSON_MODE", "false").lower() == "true",
+        "embedding_deployment": os.getenv("OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002"),
+        "batch_concurrency": int(os.getenv("PROCESS_BATCH_CONCURRENCY", "5")),
+        "batch_max_concurrency": int(os.getenv("PROCESS_BATCH_MAX_CONCURRENCY", "20")),
+        "cache_path": os.getenv("KB_CACHE_PATH", ".cache/kb_cache.sqlite"),
+        "layout_cache_mb": int(os.getenv("KB_LAYOUT_CACHE_MB", "512")),
+        "search_cache_ttl": float(os.getenv("KB_SEARCH_CACHE_TTL_SECONDS", "300")),
+        "search_cache_size": int(os.getenv("KB_SEARCH_CACHE_MAX_ENTRIES", "1000"))
     }
 
 
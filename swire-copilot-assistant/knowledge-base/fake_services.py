@@ -0,0 +1,952 @@
+"""
+Local stand-ins for the services behind the Swire knowledge base pipeline
+In-process Microsoft Graph drive tree, block blob store, search index, Form
+Recognizer and Azure OpenAI, each with configurable latency and injected
+failures, so document-processor.py and sharepoint-connector.py can be run and
+benchmarked without network access
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+SERVICES = ("graph", "blob", "search", "form_recognizer", "openai")
+
+# Matches the index definition and document-processor.py
+EMBEDDING_DIMENSIONS = 1536
+
+# Children per Graph page, as returned by SharePoint by default
+GRAPH_PAGE_SIZE = 200
+
+BLOB_DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Azurite's well-known development account, used in fake blob URLs
+AZURITE_ACCOUNT_URL = "http://127.0.0.1:10000/devstoreaccount1"
+
+WORDS = (
+    "safety procedure policy turbine blade maintenance inspection installation offshore vessel "
+    "crane lifting permit hazard risk assessment training competence contractor incident report "
+    "electrical isolation high voltage substation cable marine transfer weather window access "
+    "rope harness rescue emergency response environmental waste spill audit compliance quality "
+    "finance invoice budget payroll employee leave recruitment confidential restricted internal "
+    "schedule project handover commissioning tower nacelle gearbox generator bearing torque bolt "
+    "repair composite lightning protection leading edge erosion drone survey data analysis the "
+    "and of to in for with on at by from is are be will must should shall all any each this that"
+).split()
+
+_STOPWORDS = {"the", "and", "of", "to", "in", "for", "with", "on", "at", "by", "from", "is", "are", "be",
+              "will", "must", "should", "shall", "all", "any", "each", "this", "that"}
+
+
+class FakeServiceError(Exception):
+    """Injected failure carrying the status attributes the real SDKs expose"""
+
+    def __init__(self, service: str, status_code: int, message: str = "injected failure"):
+        super().__init__(f"{service} returned HTTP {status_code}: {message}")
+        self.status_code = status_code  # azure-core and openai
+        self.response_status_code = status_code  # msgraph
+
+
+class ServiceBehaviour:
+    """Latency and fault injection for one fake service.
+
+    Each call waits latency seconds, up to jitter more, and seconds_per_mb for
+    every megabyte it moves. It then fails with a 429 with probability
+    throttle_rate, or a 503 with probability error_rate. When more than
+    capacity calls are already in flight, the call is refused with a 429 at
+    once, like a service over its quota. Faults are drawn from a seeded
+    generator, so runs are repeatable.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seconds_per_mb: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        capacity: Optional[int] = None,
+        seed: int = 0,
+    ):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.seconds_per_mb = seconds_per_mb
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self._random = random.Random(f"{name}:{seed}")
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.throttled = 0
+        self.failed = 0
+        self.bytes = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def call(self, size: int = 0):
+        """Simulate one request moving size bytes, raising FakeServiceError on injected faults"""
+        self.calls += 1
+        if self.capacity and self.in_flight >= self.capacity:
+            self.throttled += 1
+            await asyncio.sleep(0)
+            raise FakeServiceError(self.name, 429, "too many requests")
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            delay = self.latency + self._random.random() * self.jitter + size / (1024 * 1024) * self.seconds_per_mb
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.throttled += 1
+            raise FakeServiceError(self.name, 429, "too many requests")
+        if roll < self.throttle_rate + self.error_rate:
+            self.failed += 1
+            raise FakeServiceError(self.name, 503, "service unavailable")
+        self.bytes += size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "failed": self.failed,
+            "megabytes": round(self.bytes / (1024 * 1024), 2),
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+class FakeTenant:
+    """Synthetic SharePoint tenant: sites holding document libraries of nested folders.
+
+    Every change bumps its drive's version and stamps the item with it, so
+    delta tokens are just versions. A delta query returns exactly the items
+    changed or deleted since its token.
+    """
+
+    def __init__(self, host: str = "swire.sharepoint.com"):
+        self.host = host
+        self.sites: Dict[str, SimpleNamespace] = {}  # by site path, e.g. /sites/policies
+        self.drives: Dict[str, Dict[str, Any]] = {}  # by drive id
+        self._item_drive: Dict[str, str] = {}
+        self._ids = 0
+
+    def _next_id(self, prefix: str) -> str:
+        self._ids += 1
+        return f"{prefix}{self._ids:08d}"
+
+    def add_site(self, name: str) -> str:
+        """Add a site and return its URL"""
+        path = f"/sites/{name}"
+        self.sites[path] = SimpleNamespace(
+            id=f"{self.host},{self._next_id('site-')}", display_name=name.replace("-", " ").title(),
+            web_url=f"https://{self.host}{path}", drive_ids=[]
+        )
+        return f"https://{self.host}{path}"
+
+    def add_library(self, site_url: str, name: str) -> str:
+        site = self.sites[urlparse(site_url).path]
+        drive_id = self._next_id("drive-")
+        self.drives[drive_id] = {
+            "drive": SimpleNamespace(id=drive_id, name=name, drive_type="documentLibrary"),
+            "version": 0,
+            "oldest_token": 0,
+            "items": {},
+        }
+        site.drive_ids.append(drive_id)
+        return drive_id
+
+    def _put(self, drive_id: str, record: Dict[str, Any]):
+        drive = self.drives[drive_id]
+        drive["version"] += 1
+        record["version"] = drive["version"]
+        drive["items"][record["item"].id] = record
+        self._item_drive[record["item"].id] = drive_id
+
+    def add_folder(self, drive_id: str, name: str, parent: str = "root") -> str:
+        item = SimpleNamespace(
+            id=self._next_id("folder-"), name=name, file=None, folder=SimpleNamespace(child_count=0),
+            size=0, deleted=None, last_modified_date_time=datetime.now(timezone.utc)
+        )
+        self._put(drive_id, {"item": item, "parent": parent, "content": None})
+        return item.id
+
+    def add_document(
+        self, drive_id: str, name: str, content: bytes, parent: str = "root", modified: Optional[datetime] = None
+    ) -> str:
+        item = SimpleNamespace(
+            id=self._next_id("item-"), name=name, folder=None, deleted=None, size=len(content),
+            file=SimpleNamespace(mime_type=_mime_type(name)),
+            last_modified_date_time=modified or datetime.now(timezone.utc)
+        )
+        self._put(drive_id, {"item": item, "parent": parent, "content": content})
+        return item.id
+
+    def update_document(self, item_id: str, content: bytes):
+        drive_id = self._item_drive[item_id]
+        record = self.drives[drive_id]["items"][item_id]
+        item = SimpleNamespace(**vars(record["item"]))
+        item.size = len(content)
+        item.last_modified_date_time = datetime.now(timezone.utc)
+        self._put(drive_id, {"item": item, "parent": record["parent"], "content": content})
+
+    def delete_document(self, item_id: str):
+        drive_id = self._item_drive[item_id]
+        record = self.drives[drive_id]["items"][item_id]
+        item = SimpleNamespace(id=item_id, name=record["item"].name, file=None, folder=None,
+                               deleted=SimpleNamespace(state="deleted"))
+        self._put(drive_id, {"item": item, "parent": record["parent"], "content": None, "deleted": True})
+
+    def expire_delta_links(self, drive_id: Optional[str] = None):
+        """Make existing delta tokens fail with 410 Gone, forcing a full listing"""
+        for key in [drive_id] if drive_id else list(self.drives):
+            # Tokens hold the version they were issued at; only newer ones stay valid
+            self.drives[key]["version"] += 1
+            self.drives[key]["oldest_token"] = self.drives[key]["version"]
+
+    def site_urls(self) -> List[str]:
+        return [site.web_url for site in self.sites.values()]
+
+    def content(self, item_id: str) -> Optional[bytes]:
+        drive_id = self._item_drive.get(item_id)
+        record = self.drives[drive_id]["items"].get(item_id) if drive_id else None
+        return record["content"] if record else None
+
+    def document_ids(self) -> List[str]:
+        return [
+            item_id
+            for drive in self.drives.values()
+            for item_id, record in drive["items"].items()
+            if record["content"] is not None
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        contents = [self.content(item_id) for item_id in self.document_ids()]
+        return {
+            "sites": len(self.sites),
+            "libraries": len(self.drives),
+            "documents": len(contents),
+            "unique_documents": len({zlib.crc32(content) for content in contents}),
+            "megabytes": round(sum(len(content) for content in contents) / (1024 * 1024), 2),
+        }
+
+    @classmethod
+    def generate(
+        cls,
+        documents: int,
+        sites: int = 3,
+        libraries: int = 2,
+        folders: int = 4,
+        duplicate_ratio: float = 0.1,
+        mean_size: int = 20000,
+        seed: int = 0,
+    ) -> "FakeTenant":
+        """Build a tenant of synthetic text documents spread over sites, libraries and folders.
+
+        duplicate_ratio of the documents reuse an earlier document's bytes, as
+        when a policy is copied into several sites.
+        """
+        rng = random.Random(seed)
+        tenant = cls()
+        site_names = ["policies", "procedures", "hse-documents", "operations", "finance", "hr", "engineering", "marine"]
+        library_names = ["Documents", "Procedures", "Archive", "Forms"]
+        extensions = [".pdf", ".docx", ".txt"]
+
+        # Folder ids per library, including root and up to two levels of nesting
+        locations: List[Tuple[str, str]] = []
+        for site_index in range(sites):
+            name = site_names[site_index % len(site_names)]
+            site_url = tenant.add_site(name if site_index < len(site_names) else f"{name}-{site_index}")
+            for library_index in range(libraries):
+                drive_id = tenant.add_library(site_url, library_names[library_index % len(library_names)])
+                parents = ["root"]
+                for folder_index in range(folders):
+                    parents.append(tenant.add_folder(drive_id, f"Folder {folder_index}", rng.choice(parents)))
+                locations.extend((drive_id, parent) for parent in parents)
+
+        created: List[bytes] = []
+        modified = datetime.now(timezone.utc) - timedelta(days=30)
+        for index in range(documents):
+            drive_id, parent = rng.choice(locations)
+            if created and rng.random() < duplicate_ratio:
+                content = rng.choice(created)
+            else:
+                content = synthetic_document(rng, mean_size, index)
+                created.append(content)
+            name = f"{rng.choice(WORDS[:40])}-{index:06d}{rng.choice(extensions)}"
+            tenant.add_document(drive_id, name, content, parent, modified)
+        return tenant
+
+    def mutate(self, change_ratio: float, delete_ratio: float = 0.0, seed: int = 0) -> Dict[str, int]:
+        """Edit and delete random documents, as between two scheduled syncs"""
+        rng = random.Random(f"mutate:{seed}")
+        item_ids = self.document_ids()
+        rng.shuffle(item_ids)
+        deleted = item_ids[:int(len(item_ids) * delete_ratio)]
+        changed = item_ids[len(deleted):len(deleted) + int(len(item_ids) * change_ratio)]
+        for item_id in deleted:
+            self.delete_document(item_id)
+        for item_id in changed:
+            addition = " ".join(rng.choices(WORDS, k=60)).encode()
+            self.update_document(item_id, self.content(item_id) + b"\n\nRevision note: " + addition)
+        return {"changed": len(changed), "deleted": len(deleted)}
+
+
+def synthetic_document(rng: random.Random, mean_size: int, index: int) -> bytes:
+    """Plain text of roughly mean_size bytes (half to one and a half times) made of domain words"""
+    target = max(200, int(mean_size * (0.5 + rng.random())))
+    lines = [f"Document {index}: {' '.join(rng.choices(WORDS[:40], k=6)).title()}"]
+    size = len(lines[0])
+    while size < target:
+        line = " ".join(rng.choices(WORDS, k=rng.randint(8, 16))).capitalize() + "."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines).encode()
+
+
+def _mime_type(name: str) -> str:
+    return {
+        ".pdf": "application/pdf",
+        ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ".txt": "text/plain",
+    }.get(name[name.rfind("."):].lower(), "application/octet-stream")
+
+
+class _GraphPagedRequest:
+    """children or delta request for one drive item; with_url() follows next and delta links"""
+
+    def __init__(self, graph: "FakeGraphClient", kind: str, drive_id: str, item_id: str, url: Optional[str] = None):
+        self.graph = graph
+        self.kind = kind
+        self.drive_id = drive_id
+        self.item_id = item_id
+        self.url = url
+
+    def with_url(self, url: str) -> "_GraphPagedRequest":
+        return _GraphPagedRequest(self.graph, self.kind, self.drive_id, self.item_id, url)
+
+    async def get(self) -> SimpleNamespace:
+        await self.graph.behaviour.call()
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.url or "").query).items()}
+        if self.kind == "children":
+            return self.graph._children_page(self.drive_id, self.item_id, int(query.get("$skiptoken", 0)))
+        return self.graph._delta_page(self.drive_id, query)
+
+
+class FakeGraphClient:
+    """Subset of GraphServiceClient used by the connector: site lookup, drive listing,
+    folder children and delta queries, all paged like Graph"""
+
+    def __init__(self, tenant: FakeTenant, behaviour: ServiceBehaviour, page_size: int = GRAPH_PAGE_SIZE):
+        self.tenant = tenant
+        self.behaviour = behaviour
+        self.page_size = page_size
+
+    @property
+    def sites(self) -> SimpleNamespace:
+        return SimpleNamespace(by_site_id=self._site_request)
+
+    @property
+    def drives(self) -> SimpleNamespace:
+        return SimpleNamespace(by_drive_id=self._drive_request)
+
+    def _find_site(self, key: str) -> SimpleNamespace:
+        # Either "hostname:/sites/name" or a site id
+        path = key.split(":", 1)[1] if ":" in key else None
+        for site_path, site in self.tenant.sites.items():
+            if site_path == path or site.id == key:
+                return site
+        raise FakeServiceError("graph", 404, f"site {key} not found")
+
+    def _site_request(self, key: str) -> SimpleNamespace:
+        async def get_site():
+            await self.behaviour.call()
+            return self._find_site(key)
+
+        async def get_drives():
+            await self.behaviour.call()
+            site = self._find_site(key)
+            return SimpleNamespace(value=[self.tenant.drives[drive_id]["drive"] for drive_id in site.drive_ids])
+
+        async def get_default_drive():
+            await self.behaviour.call()
+            return self.tenant.drives[self._find_site(key).drive_ids[0]]["drive"]
+
+        return SimpleNamespace(
+            get=get_site, drives=SimpleNamespace(get=get_drives), drive=SimpleNamespace(get=get_default_drive)
+        )
+
+    def _drive_request(self, drive_id: str) -> SimpleNamespace:
+        def item_request(item_id: str) -> SimpleNamespace:
+            return SimpleNamespace(
+                children=_GraphPagedRequest(self, "children", drive_id, item_id),
+                delta=_GraphPagedRequest(self, "delta", drive_id, item_id),
+            )
+
+        return SimpleNamespace(items=SimpleNamespace(by_drive_item_id=item_request))
+
+    def _link(self, drive_id: str, path: str, **query: Any) -> str:
+        params = "&".join(f"{key}={value}" for key, value in query.items())
+        return f"https://graph.microsoft.com/v1.0/drives/{drive_id}/{path}?{params}"
+
+    def _children_page(self, drive_id: str, folder_id: str, offset: int) -> SimpleNamespace:
+        drive = self.tenant.drives[drive_id]
+        children = [
+            record["item"] for record in drive["items"].values()
+            if record["parent"] == folder_id and not record.get("deleted")
+        ]
+        page = children[offset:offset + self.page_size]
+        next_offset = offset + self.page_size
+        return SimpleNamespace(
+            value=page,
+            odata_next_link=(
+                self._link(drive_id, f"items/{folder_id}/children", **{"$skiptoken": next_offset})
+                if next_offset < len(children) else None
+            ),
+            odata_delta_link=None,
+        )
+
+    def _delta_page(self, drive_id: str, query: Dict[str, str]) -> SimpleNamespace:
+        drive = self.tenant.drives[drive_id]
+        token = query.get("token", "0")
+        if token == "latest":
+            return SimpleNamespace(
+                value=[], odata_next_link=None, odata_delta_link=self._link(drive_id, "root/delta", token=drive["version"])
+            )
+
+        since = int(token)
+        if since < drive["oldest_token"]:
+            raise FakeServiceError("graph", 410, "resync required")
+
+        # Pages of one delta round stop at the version seen on its first page
+        until = int(query.get("until", drive["version"]))
+        offset = int(query.get("skip", 0))
+        changes = sorted(
+            (record for record in drive["items"].values() if since < record["version"] <= until),
+            key=lambda record: record["version"],
+        )
+        page = [record["item"] for record in changes[offset:offset + self.page_size]]
+        if offset + self.page_size < len(changes):
+            next_link = self._link(drive_id, "root/delta", token=since, until=until, skip=offset + self.page_size)
+            return SimpleNamespace(value=page, odata_next_link=next_link, odata_delta_link=None)
+        return SimpleNamespace(
+            value=page, odata_next_link=None, odata_delta_link=self._link(drive_id, "root/delta", token=until)
+        )
+
+    async def close(self):
+        pass
+
+
+class _GraphContentResponse:
+    def __init__(self, status: int, content: bytes = b""):
+        self.status = status
+        self._content = content
+        self.content = SimpleNamespace(iter_chunked=self._iter_chunked)
+
+    async def _iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        for start in range(0, len(self._content), size):
+            yield self._content[start:start + size]
+
+    async def __aenter__(self) -> "_GraphContentResponse":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class _GraphContentRequest:
+    def __init__(self, session: "FakeGraphSession", url: str):
+        self.session = session
+        self.url = url
+
+    async def __aenter__(self) -> _GraphContentResponse:
+        match = re.search(r"/items/([^/]+)/content", self.url)
+        content = self.session.tenant.content(match.group(1)) if match else None
+        try:
+            await self.session.behaviour.call(len(content or b""))
+        except FakeServiceError as e:
+            return _GraphContentResponse(e.status_code)
+        if content is None:
+            return _GraphContentResponse(404)
+        return _GraphContentResponse(200, content)
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeGraphSession:
+    """Stand-in for the aiohttp session the connector downloads document content with"""
+
+    def __init__(self, tenant: FakeTenant, behaviour: ServiceBehaviour):
+        self.tenant = tenant
+        self.behaviour = behaviour
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> _GraphContentRequest:
+        return _GraphContentRequest(self, url)
+
+    async def close(self):
+        pass
+
+
+class FakeCredential:
+    """Stand-in for DefaultAzureCredential"""
+
+    async def get_token(self, *scopes: str) -> SimpleNamespace:
+        return SimpleNamespace(token="fake-token", expires_on=int(time.time()) + 3600)
+
+    async def close(self):
+        pass
+
+
+class _BlobDownloader:
+    def __init__(self, data: bytes, chunk_size: int):
+        self._data = data
+        self._chunk_size = chunk_size
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        for start in range(0, len(self._data), self._chunk_size):
+            yield self._data[start:start + self._chunk_size]
+
+    async def readall(self) -> bytes:
+        return self._data
+
+
+class FakeBlobClient:
+    """One blob in a FakeBlobService, with the azure-storage-blob aio BlobClient calls the pipeline makes"""
+
+    def __init__(self, service: "FakeBlobService", container: str, name: str):
+        self.service = service
+        self.container = container
+        self.name = name
+        self.url = f"{AZURITE_ACCOUNT_URL}/{container}/{name}"
+
+    def _stored(self) -> SimpleNamespace:
+        blob = self.service.containers.get(self.container, {}).get(self.name)
+        if blob is None:
+            raise FakeServiceError("blob", 404, f"blob {self.container}/{self.name} not found")
+        return blob
+
+    def _store(self, data: bytes, metadata: Optional[Dict[str, str]], content_settings: Any = None):
+        self.service.versions += 1
+        self.service.containers.setdefault(self.container, {})[self.name] = SimpleNamespace(
+            name=self.name, data=data, size=len(data), metadata=dict(metadata or {}),
+            content_settings=content_settings, etag=f'"0x{self.service.versions:016X}"',
+            last_modified=datetime.now(timezone.utc), copy=SimpleNamespace(status="success")
+        )
+
+    async def stage_block(self, block_id: str, data: bytes, **kwargs: Any):
+        await self.service.behaviour.call(len(data))
+        self.service.staged.setdefault((self.container, self.name), {})[block_id] = bytes(data)
+
+    async def commit_block_list(
+        self, block_list: List[str], metadata: Optional[Dict[str, str]] = None, content_settings: Any = None, **kwargs: Any
+    ):
+        await self.service.behaviour.call()
+        staged = self.service.staged.pop((self.container, self.name), {})
+        self._store(b"".join(staged[block_id] for block_id in block_list), metadata, content_settings)
+
+    async def upload_blob(self, data: bytes, overwrite: bool = False, metadata: Optional[Dict[str, str]] = None, **kwargs: Any):
+        await self.service.behaviour.call(len(data))
+        self._store(bytes(data), metadata, kwargs.get("content_settings"))
+
+    async def get_blob_properties(self, **kwargs: Any) -> SimpleNamespace:
+        await self.service.behaviour.call()
+        return self._stored()
+
+    async def download_blob(self, max_concurrency: int = 1, **kwargs: Any) -> _BlobDownloader:
+        blob = self._stored()
+        await self.service.behaviour.call(blob.size)
+        return _BlobDownloader(blob.data, BLOB_DOWNLOAD_CHUNK_SIZE)
+
+    async def start_copy_from_url(self, source_url: str, **kwargs: Any) -> Dict[str, str]:
+        path = unquote(urlparse(source_url).path).split("/", 3)
+        source = FakeBlobClient(self.service, path[2], path[3])._stored()
+        await self.service.behaviour.call()
+        self._store(source.data, source.metadata, source.content_settings)
+        return {"copy_status": "success", "copy_id": f"copy-{self.service.versions}"}
+
+    async def delete_blob(self, **kwargs: Any):
+        await self.service.behaviour.call()
+        self._stored()
+        del self.service.containers[self.container][self.name]
+
+
+class FakeContainerClient:
+    def __init__(self, service: "FakeBlobService", container: str):
+        self.service = service
+        self.container = container
+
+    async def list_blobs(self, name_starts_with: Optional[str] = None, **kwargs: Any) -> AsyncIterator[SimpleNamespace]:
+        names = sorted(
+            name for name in self.service.containers.get(self.container, {})
+            if not name_starts_with or name.startswith(name_starts_with)
+        )
+        # One request per listing page of 5000 blobs
+        for start in range(0, max(len(names), 1), 5000):
+            await self.service.behaviour.call()
+            for name in names[start:start + 5000]:
+                blob = self.service.containers[self.container].get(name)
+                if blob is not None:
+                    yield blob
+
+
+class FakeBlobService:
+    """In-memory stand-in for the azure-storage-blob aio BlobServiceClient.
+
+    Blocks are staged per blob and only become visible when the block list
+    is committed. Every write gets a new ETag. Copies resolve Azurite-style
+    URLs. For a real Azurite emulator, pass a BlobServiceClient to
+    FakeServices instead.
+    """
+
+    def __init__(self, behaviour: ServiceBehaviour):
+        self.behaviour = behaviour
+        self.containers: Dict[str, Dict[str, SimpleNamespace]] = {}
+        self.staged: Dict[Tuple[str, str], Dict[str, bytes]] = {}
+        self.versions = 0
+
+    def get_blob_client(self, container: str, blob: str) -> FakeBlobClient:
+        return FakeBlobClient(self, container, blob)
+
+    def get_container_client(self, container: str) -> FakeContainerClient:
+        return FakeContainerClient(self, container)
+
+    def stats(self) -> Dict[str, Any]:
+        blobs = [blob for container in self.containers.values() for blob in container.values()]
+        return {
+            "blobs": len(blobs),
+            "stored_megabytes": round(sum(blob.size for blob in blobs) / (1024 * 1024), 2),
+            "uncommitted_blobs": len(self.staged),
+        }
+
+    async def close(self):
+        pass
+
+
+_FILTER_CLAUSE = re.compile(r"^\s*(\w+)\s+(eq|ne|gt|ge|lt|le)\s+('(?:[^']|'')*'|-?\d+(?:\.\d+)?|true|false)\s*$")
+
+
+def _filter_predicate(expression: Optional[str]):
+    """Compile the OData subset the pipeline uses: comparisons joined with "and" """
+    if not expression:
+        return lambda document: True
+
+    clauses = []
+    for clause in re.split(r"\s+and\s+", expression.strip()):
+        match = _FILTER_CLAUSE.match(clause)
+        if not match:
+            raise FakeServiceError("search", 400, f"unsupported filter clause: {clause}")
+        field, operator, literal = match.groups()
+        if literal.startswith("'"):
+            value: Any = literal[1:-1].replace("''", "'")
+        elif literal in ("true", "false"):
+            value = literal == "true"
+        else:
+            value = float(literal)
+        clauses.append((field, operator, value))
+
+    comparisons = {
+        "eq": lambda a, b: a == b, "ne": lambda a, b: a != b,
+        "gt": lambda a, b: a > b, "ge": lambda a, b: a >= b,
+        "lt": lambda a, b: a < b, "le": lambda a, b: a <= b,
+    }
+
+    def matches(document: Dict[str, Any]) -> bool:
+        for field, operator, value in clauses:
+            actual = document.get(field)
+            if actual is None or not comparisons[operator](actual, value):
+                return False
+        return True
+
+    return matches
+
+
+class _SearchResults:
+    def __init__(self, hits: List[Dict[str, Any]]):
+        self._hits = hits
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Dict[str, Any]]:
+        for hit in self._hits:
+            yield hit
+
+
+class FakeSearchClient:
+    """In-memory stand-in for the azure-search-documents aio SearchClient.
+
+    Supports uploads, merges, deletes, lookups by key, and searches with the
+    filters the pipeline issues. Vector queries rank by cosine similarity;
+    otherwise hits rank by how often the query terms occur in content.
+    """
+
+    def __init__(self, behaviour: ServiceBehaviour):
+        self.behaviour = behaviour
+        self.documents: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _result(key: str, succeeded: bool = True, status_code: int = 200) -> SimpleNamespace:
+        return SimpleNamespace(
+            key=key, succeeded=succeeded, status_code=status_code,
+            error_message=None if succeeded else "Document not found."
+        )
+
+    async def upload_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[SimpleNamespace]:
+        await self.behaviour.call(len(json.dumps(documents, default=str)))
+        for document in documents:
+            self.documents[document["id"]] = dict(document)
+        return [self._result(document["id"], status_code=201) for document in documents]
+
+    async def merge_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[SimpleNamespace]:
+        await self.behaviour.call()
+        results = []
+        for document in documents:
+            stored = self.documents.get(document["id"])
+            if stored is not None:
+                stored.update(document)
+            results.append(self._result(document["id"], stored is not None, 200 if stored is not None else 404))
+        return results
+
+    async def delete_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[SimpleNamespace]:
+        await self.behaviour.call()
+        for document in documents:
+            self.documents.pop(document["id"], None)
+        return [self._result(document["id"]) for document in documents]
+
+    async def get_document(self, key: str, selected_fields: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        await self.behaviour.call()
+        document = self.documents.get(key)
+        if document is None:
+            raise FakeServiceError("search", 404, f"document {key} not found")
+        return {field: document.get(field) for field in selected_fields} if selected_fields else dict(document)
+
+    async def search(
+        self,
+        search_text: Optional[str] = None,
+        filter: Optional[str] = None,
+        select: Optional[List[str]] = None,
+        top: Optional[int] = None,
+        vector_queries: Optional[List[Any]] = None,
+        **kwargs: Any,
+    ) -> _SearchResults:
+        await self.behaviour.call()
+        matches = _filter_predicate(filter)
+        terms = [term for term in re.findall(r"\w+", (search_text or "").lower()) if term not in _STOPWORDS]
+        vector = getattr(vector_queries[0], "vector", None) if vector_queries else None
+
+        scored = []
+        for document in self.documents.values():
+            if not matches(document):
+                continue
+            content = str(document.get("content") or "").lower()
+            text_score = sum(content.count(term) for term in terms)
+            if terms and not text_score and vector is None:
+                continue
+            score = _cosine(vector, document.get("contentVector")) if vector is not None else float(text_score or 1)
+            scored.append((score, document))
+
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        hits = []
+        for score, document in scored[:top] if top else scored:
+            hit = {field: document.get(field) for field in select} if select else dict(document)
+            hit["@search.score"] = score
+            hit["@search.highlights"] = {"content": _highlights(str(document.get("content") or ""), terms)}
+            hit["@search.captions"] = None
+            hits.append(hit)
+        return _SearchResults(hits)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.documents),
+            "parents": len({document.get("parentId") for document in self.documents.values()}),
+        }
+
+    async def close(self):
+        pass
+
+
+def _cosine(a: Optional[List[float]], b: Optional[List[float]]) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _highlights(content: str, terms: List[str]) -> List[str]:
+    fragments = []
+    for line in content.splitlines():
+        lowered = line.lower()
+        if any(term in lowered for term in terms):
+            fragments.append(re.sub(
+                "(" + "|".join(map(re.escape, terms)) + ")", r"<em>\1</em>", line[:200], flags=re.IGNORECASE
+            ))
+            if len(fragments) == 3:
+                break
+    return fragments
+
+
+class _AnalyzePoller:
+    def __init__(self, result: SimpleNamespace):
+        self._result = result
+
+    async def result(self) -> SimpleNamespace:
+        return self._result
+
+
+class FakeFormRecognizer:
+    """Stand-in for the Form Recognizer DocumentAnalysisClient.
+
+    Reads the document as UTF-8 text and returns it as pages of lines, with
+    the span offset of each line.
+    """
+
+    def __init__(self, behaviour: ServiceBehaviour, lines_per_page: int = 50):
+        self.behaviour = behaviour
+        self.lines_per_page = lines_per_page
+
+    async def begin_analyze_document(self, model_id: str, document: Any, **kwargs: Any) -> _AnalyzePoller:
+        data = document if isinstance(document, (bytes, bytearray)) else document.read()
+        await self.behaviour.call(len(data))
+
+        text = bytes(data).decode("utf-8", errors="ignore")
+        pages, offset = [], 0
+        lines = text.splitlines()
+        for start in range(0, max(len(lines), 1), self.lines_per_page):
+            page_lines = []
+            for line in lines[start:start + self.lines_per_page]:
+                page_lines.append(SimpleNamespace(content=line, spans=[SimpleNamespace(offset=offset, length=len(line))]))
+                offset += len(line) + 1
+            pages.append(SimpleNamespace(page_number=len(pages) + 1, lines=page_lines))
+        return _AnalyzePoller(SimpleNamespace(pages=pages, content=text))
+
+    async def close(self):
+        pass
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Deterministic unit vector from hashed words, so texts sharing words are similar"""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        bucket = zlib.crc32(word.encode())
+        vector[bucket % dimensions] += 1.0 if bucket & 0x80000000 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+
+def fake_tags(text: str, count: int = 4) -> List[str]:
+    """Most frequent longer words of a text, as a tagging model might pick"""
+    words = [word for word in re.findall(r"[a-z]{5,}", text.lower()) if word not in _STOPWORDS]
+    return [word for word, _ in Counter(words).most_common(count)]
+
+
+class FakeOpenAI:
+    """Deterministic stand-in for AsyncAzureOpenAI embeddings and chat completions.
+
+    Embeddings come from fake_embedding. Chat answers the tagging prompt: each
+    "### Document n" section in the user message gets fake_tags, returned as
+    the JSON object the prompt asks for.
+    """
+
+    def __init__(self, behaviour: ServiceBehaviour, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.behaviour = behaviour
+        self.dimensions = dimensions
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    async def _create_embeddings(self, model: str, input: Any, **kwargs: Any) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        await self.behaviour.call(sum(len(text) for text in texts))
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=index, embedding=fake_embedding(text, self.dimensions)) for index, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=sum(len(text) // 4 for text in texts)),
+        )
+
+    async def _create_chat_completion(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> SimpleNamespace:
+        prompt = "\n".join(message["content"] for message in messages if message["role"] == "user")
+        await self.behaviour.call(len(prompt))
+
+        sections = re.split(r"^### Document (\d+)\n", prompt, flags=re.MULTILINE)
+        entries = [
+            {"id": int(number), "tags": fake_tags(body)}
+            for number, body in zip(sections[1::2], sections[2::2])
+        ]
+        content = json.dumps({"documents": entries}) if entries else ", ".join(fake_tags(prompt))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4),
+        )
+
+    async def close(self):
+        pass
+
+
+class FakeServices:
+    """A full set of fake services for one tenant.
+
+    Attached to a DocumentProcessor and a SharePointConnector in place of the
+    clients their initialize() would create; do not call initialize().
+    """
+
+    def __init__(
+        self,
+        tenant: FakeTenant,
+        behaviours: Optional[Dict[str, ServiceBehaviour]] = None,
+        blob_service: Any = None,
+    ):
+        behaviours = behaviours or {}
+        self.tenant = tenant
+        self.behaviours = {service: behaviours.get(service) or ServiceBehaviour(service) for service in SERVICES}
+        self.graph = FakeGraphClient(tenant, self.behaviours["graph"])
+        self.graph_session = FakeGraphSession(tenant, self.behaviours["graph"])
+        self.blob = blob_service or FakeBlobService(self.behaviours["blob"])
+        self.search = FakeSearchClient(self.behaviours["search"])
+        self.form_recognizer = FakeFormRecognizer(self.behaviours["form_recognizer"])
+        self.openai = FakeOpenAI(self.behaviours["openai"])
+        self.credential = FakeCredential()
+
+    def attach_processor(self, processor: Any):
+        processor.credential = self.credential
+        processor.blob_client = self.blob
+        processor.search_client = self.search
+        processor.form_recognizer_client = self.form_recognizer
+        processor.openai_client = self.openai
+
+    def attach_connector(self, connector: Any, processor: Any):
+        """Wire the connector and its document processor to these services"""
+        self.attach_processor(processor)
+        connector.credential = self.credential
+        connector.graph_client = self.graph
+        connector.http_session = self.graph_session
+        connector.blob_client = self.blob
+        connector.document_processor = processor
+        connector.processor_semaphore = asyncio.Semaphore(processor.max_concurrency)
+
+    def reset_stats(self):
+        for behaviour in self.behaviours.values():
+            behaviour.reset_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {service: behaviour.stats() for service, behaviour in self.behaviours.items()}
+        if isinstance(self.blob, FakeBlobService):
+            stats["blob"].update(self.blob.stats())
+        stats["search"].update(self.search.stats())
+        return stats
@@ -0,0 +1,149 @@
+"""
+Local caches for the Swire knowledge base pipeline
+Avoids repeating paid analysis calls when unchanged documents are reprocessed
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class LayoutCache:
+    """Form Recognizer page layouts keyed on (blob name, ETag or content hash, model id).
+
+    Layouts are stored as zlib-compressed JSON of
+    [{"p": page_number, "l": [[line, offset, length], ...]}, ...]
+    and evicted least-recently-used once the total exceeds max_bytes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = _connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS layouts (
+                key TEXT PRIMARY KEY,
+                blob_name TEXT NOT NULL,
+                version TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                layout BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+
+    @staticmethod
+    def key(blob_name: str, version: str, model_id: str) -> str:
+        return hashlib.sha256(f"{blob_name}|{version}|{model_id}".encode("utf-8")).hexdigest()
+
+    def get(self, blob_name: str, version: str, model_id: str) -> Optional[List[Dict[str, Any]]]:
+        key = self.key(blob_name, version, model_id)
+        row = self.conn.execute("SELECT layout FROM layouts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE layouts SET last_used = ? WHERE key = ?", (time.time(), key))
+        compact = json.loads(zlib.decompress(row[0]))
+        return [
+            {
+                "page_number": page["p"],
+                "lines": [line[0] for line in page["l"]],
+                "spans": [(line[1], line[2]) for line in page["l"]]
+            }
+            for page in compact
+        ]
+
+    def put(self, blob_name: str, version: str, model_id: str, pages: List[Dict[str, Any]]):
+        compact = [
+            {
+                "p": page["page_number"],
+                "l": [
+                    [line, *span]
+                    for line, span in zip(page["lines"], page.get("spans") or [(None, None)] * len(page["lines"]))
+                ]
+            }
+            for page in pages
+        ]
+        blob = zlib.compress(json.dumps(compact, separators=(",", ":")).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            logger.debug(f"Layout for {blob_name} exceeds the cache size cap, not cached")
+            return
+
+        # Older versions of the same blob can never be hit again
+        self.conn.execute("DELETE FROM layouts WHERE blob_name = ? AND model_id = ?", (blob_name, model_id))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO layouts VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.key(blob_name, version, model_id), blob_name, version, model_id, blob, len(blob), time.time()),
+        )
+        self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM layouts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM layouts ORDER BY last_used").fetchall():
+            self.conn.execute("DELETE FROM layouts WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM layouts").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.conn.close()
+
+
+class TagCache:
+    """LLM-generated tags keyed on sha256 of the prompt version and the text sent to the model"""
+
+    def __init__(self, path: Path):
+        self.hits = 0
+        self.misses = 0
+        self.conn = _connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tags (key TEXT PRIMARY KEY, tags TEXT NOT NULL, created REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def key(prefix: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{prompt_version}\0{prefix}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        row = self.conn.execute("SELECT tags FROM tags WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, tags: List[str]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tags VALUES (?, ?, ?)", (key, json.dumps(tags), time.time())
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.conn.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.conn.close()
+
@@ -0,0 +1,112 @@
+"""In-process TTL cache for search results, invalidated by the index generation.
+
+Entries expire after ttl_seconds, and are dropped early when the generation
+read from the shared ingest state no longer matches the one they were stored
+under, so a re-ingest is visible on the next query.
+
+The knowledge base pipeline in swire-copilot-assistant deploys on its own, so
+it carries a verbatim copy of this file. Edit this one, copy it over, and keep
+it free of imports from the rest of the package; test_shared_modules.py fails
+while the two differ.
+"""
+
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+BUSY_TIMEOUT_SECONDS = 30
+
+
+class IndexGeneration:
+    """Counter bumped whenever documents are written to or removed from a search index.
+
+    Kept in a SQLite database (WAL mode) on a local disk, so every process on
+    the host that writes or searches the index sees the same value.
+    """
+
+    def __init__(self, path: Path, index_name: str):
+        self.index_name = index_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+
+    def current(self) -> int:
+        row = self.conn.execute(
+            "SELECT generation FROM index_generations WHERE name = ?", (self.index_name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self) -> int:
+        self.conn.execute(
+            "INSERT INTO index_generations (name, generation) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET generation = generation + 1",
+            (self.index_name,),
+        )
+        return self.current()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class SearchResultCache:
+    """LRU map of (normalised query, filters, top) to results, with hit/miss counts"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, generation: Optional[Callable[[], int]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = generation or (lambda: 0)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._miss_generations: Dict[Hashable, int] = {}
+
+    @staticmethod
+    def key(query: str, filters: Optional[Dict[str, Any]] = None, top: int = 0) -> Hashable:
+        normalised = " ".join(query.lower().split())
+        return normalised, tuple(sorted((filters or {}).items())), top
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        current = self.generation()
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, generation, value = entry
+            if time.monotonic() - stored_at < self.ttl_seconds and generation == current:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        # Results fetched after this miss are stored under the generation seen now,
+        # so an ingest that finishes mid-search still invalidates them
+        if len(self._miss_generations) >= max(self.max_entries, 1):
+            self._miss_generations.clear()
+        self._miss_generations[key] = current
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        generation = self._miss_generations.pop(key, None)
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        if generation is None:
+            generation = self.generation()
+        self._entries[key] = (time.monotonic(), generation, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -5,24 +5,46 @@ Handles document synchronization from SharePoint Online to Azure Cognitive Searc
 
 import os
 import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import math
+import signal
+import time
+import uuid
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import asyncio
+from pathlib import Path
 
 import aiohttp
 from azure.identity.aio import DefaultAzureCredential
 from microsoft.graph import GraphServiceClient
 from microsoft.graph.generated.models.drive_item import DriveItem
 from microsoft.graph.generated.models.site import Site
+from azure.storage.blob import ContentSettings
 from azure.storage.blob.aio import BlobServiceClient
 
 from document_processor import DocumentProcessor
+from sync_state import SyncState
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Graph downloads are piped into blob blocks of this size, one block in memory per document
+BLOB_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Keep-alive connections to Graph beyond the Graph concurrency limit, for webhook lookups
+GRAPH_POOL_HEADROOM = 4
+
+# Weight of the latest sync when updating a site's learned change rate
+SITE_RATE_SMOOTHING = 0.3
+
+# Backoff for queued webhook notifications that fail, doubling per attempt up to the cap
+WEBHOOK_RETRY_BASE_SECONDS = 5
+WEBHOOK_RETRY_MAX_SECONDS = 600
+
 class SharePointConnector:
     """Connects to SharePoint Online and syncs documents to knowledge base"""
     
@@ -32,6 +54,32 @@ class SharePointConnector:
         self.blob_client = None
         self.document_processor = None
         self.credential = None
+        self.sync_state = SyncState(Path(config.get("sync_state_path") or ".cache/sharepoint_sync.sqlite"))
+        
+        # Independent limits so a slow service only throttles its own calls
+        self.site_concurrency = int(config.get("site_concurrency") or 4)
+        self.document_concurrency = int(config.get("document_concurrency") or 16)
+        self.graph_concurrency = int(config.get("graph_concurrency") or 8)
+        self.graph_semaphore = asyncio.Semaphore(self.graph_concurrency)
+        self.blob_semaphore = asyncio.Semaphore(int(config.get("blob_concurrency") or 8))
+        self.processor_semaphore = None
+        self.http_session = None
+        
+        # Webhook bursts for one item collapse into a single sync once it goes quiet
+        self.webhook_debounce = float(config.get("webhook_debounce_seconds") or 5)
+        self.webhook_max_delay = float(config.get("webhook_max_delay_seconds") or 30)
+        self.webhook_concurrency = int(config.get("webhook_concurrency") or 4)
+        self.webhook_max_attempts = int(config.get("webhook_max_attempts") or 8)
+        
+        # Scheduled polling: a site is synced when it should have about
+        # sync_target_changes waiting, within the interval bounds
+        self.sync_min_interval = float(config.get("sync_min_interval_seconds") or 300)
+        self.sync_max_interval = float(config.get("sync_max_interval_seconds") or 21600)
+        self.sync_target_changes = float(config.get("sync_target_changes") or 25)
+        self.progress: Dict[str, Dict[str, int]] = {}
+        
+        # Identical content found concurrently in several places is stored once
+        self.content_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
         
     async def initialize(self):
         """Initialize Microsoft Graph and Azure clients"""
@@ -45,6 +93,12 @@ class SharePointConnector:
                 scopes=['https://graph.microsoft.com/.default']
             )
             
+            # Shared keep-alive pool for Graph content downloads
+            self.http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.graph_concurrency + GRAPH_POOL_HEADROOM),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+            )
+            
             # Initialize Blob Storage client
             self.blob_client = BlobServiceClient(
                 account_url=f"https://{self.config['storage_account']}.blob.core.windows.net",
@@ -54,6 +108,7 @@ class SharePointConnector:
             # Initialize document processor
             self.document_processor = DocumentProcessor(self.config)
             await self.document_processor.initialize()
+            self.processor_semaphore = asyncio.Semaphore(self.document_processor.max_concurrency)
             
             logger.info("Successfully initialized SharePoint connector")
             
@@ -61,36 +116,150 @@ class SharePointConnector:
             logger.error(f"Failed to initialize SharePoint connector: {str(e)}")
             raise
 
-    async def sync_sharepoint_sites(self, site_urls: List[str]) -> Dict[str, Any]:
-        """Sync documents from multiple SharePoint sites"""
+    async def sync_sharepoint_sites(self, site_urls: List[str], full_resync: bool = False) -> Dict[str, Any]:
+        """Sync documents from multiple SharePoint sites concurrently.
+        
+        Each document library is read through its Graph delta link, so only
+        items changed or deleted since the last successful sync are fetched.
+        full_resync discards stored delta links and enumerates everything.
+        Up to site_concurrency sites run at once; live per-site counts are
+        available from get_sync_progress().
+        """
         results = {
             "sites_processed": 0,
             "documents_synced": 0,
             "documents_failed": 0,
-            "errors": []
+            "documents_deleted": 0,
+            "errors": [],
+            "sites": {}
         }
+        site_semaphore = asyncio.Semaphore(self.site_concurrency)
         
-        for site_url in site_urls:
-            try:
-                logger.info(f"Processing SharePoint site: {site_url}")
-                site_result = await self._sync_single_site(site_url)
-                
-                results["sites_processed"] += 1
-                results["documents_synced"] += site_result["synced"]
-                results["documents_failed"] += site_result["failed"]
-                results["errors"].extend(site_result["errors"])
-                
-            except Exception as e:
-                logger.error(f"Failed to process site {site_url}: {str(e)}")
-                results["errors"].append({
-                    "site": site_url,
-                    "error": str(e)
-                })
+        async def sync_site(site_url: str):
+            async with site_semaphore:
+                try:
+                    logger.info(f"Processing SharePoint site: {site_url}")
+                    site_result = await self._sync_single_site(site_url, full_resync)
+                    
+                    results["sites_processed"] += 1
+                    results["documents_synced"] += site_result["synced"]
+                    results["documents_failed"] += site_result["failed"]
+                    results["documents_deleted"] += site_result["deleted"]
+                    results["errors"].extend(site_result["errors"])
+                    results["sites"][site_url] = self.progress[site_url]
+                    
+                except Exception as e:
+                    logger.error(f"Failed to process site {site_url}: {str(e)}")
+                    results["errors"].append({
+                        "site": site_url,
+                        "error": str(e)
+                    })
         
+        await asyncio.gather(*(sync_site(site_url) for site_url in site_urls))
         return results
 
-    async def _sync_single_site(self, site_url: str) -> Dict[str, Any]:
-        """Sync documents from a single SharePoint site"""
+    async def run_sync_scheduler(self, site_urls: List[str], stop: asyncio.Event, poll_interval: float = 5.0):
+        """Keep sites in sync until stop is set, polling busy sites more often than static ones.
+        
+        Each site's change rate is learned from previous syncs; a site is due
+        once it is expected to have sync_target_changes changes waiting, but
+        never sooner than sync_min_interval or later than sync_max_interval.
+        Due sites are started in order of expected backlog, at most
+        site_concurrency at a time, and all share the Graph, blob and processor
+        limits, so busy sites get the quota quiet ones no longer spend.
+        """
+        in_flight: Dict[str, asyncio.Task] = {}
+        
+        while not stop.is_set():
+            now = time.time()
+            due = []
+            for site_url in site_urls:
+                if site_url in in_flight:
+                    continue
+                site = self.sync_state.get_site(site_url)
+                if site is None:
+                    due.append((math.inf, site_url))
+                elif now >= self._next_site_sync(site):
+                    due.append((self._expected_changes(site, now), site_url))
+            
+            due.sort(reverse=True)
+            for _, site_url in due[:self.site_concurrency - len(in_flight)]:
+                task = asyncio.create_task(self._scheduled_site_sync(site_url))
+                in_flight[site_url] = task
+                task.add_done_callback(lambda _, site_url=site_url: in_flight.pop(site_url, None))
+            
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        
+        if in_flight:
+            await asyncio.gather(*in_flight.values(), return_exceptions=True)
+
+    async def _scheduled_site_sync(self, site_url: str):
+        try:
+            await self._sync_single_site(site_url)
+        except Exception as e:
+            # Wait at least the minimum interval before trying a failing site again
+            logger.error(f"Scheduled sync of {site_url} failed: {str(e)}")
+            site = self.sync_state.get_site(site_url) or {"last_sync": None, "change_rate": None}
+            self.sync_state.put_site(site_url, site["last_sync"], time.time(), site["change_rate"])
+
+    def _record_site_sync(self, site_url: str, changes: int, learn: bool = True):
+        """Fold a successful sync's change count into the site's smoothed changes per hour"""
+        now = time.time()
+        site = self.sync_state.get_site(site_url)
+        change_rate = site["change_rate"] if site else None
+        
+        if learn and site and site["last_sync"] and now > site["last_sync"]:
+            observed = changes * 3600 / (now - site["last_sync"])
+            if change_rate is None:
+                change_rate = observed
+            else:
+                change_rate = SITE_RATE_SMOOTHING * observed + (1 - SITE_RATE_SMOOTHING) * change_rate
+        
+        self.sync_state.put_site(site_url, now, now, change_rate)
+
+    def _sync_interval(self, change_rate: Optional[float]) -> float:
+        """Seconds between polls for a site with this many changes per hour"""
+        if change_rate is None:
+            # Not learned yet: poll again soon to measure it
+            return self.sync_min_interval
+        if change_rate <= 0:
+            return self.sync_max_interval
+        interval = self.sync_target_changes / change_rate * 3600
+        return min(self.sync_max_interval, max(self.sync_min_interval, interval))
+
+    def _next_site_sync(self, site: Dict[str, Any]) -> float:
+        retry_at = site["last_attempt"] + self.sync_min_interval
+        if site["last_sync"] is None:
+            return retry_at
+        return max(site["last_sync"] + self._sync_interval(site["change_rate"]), retry_at)
+
+    @staticmethod
+    def _expected_changes(site: Dict[str, Any], now: float) -> float:
+        if site["last_sync"] is None or site["change_rate"] is None:
+            return math.inf
+        return site["change_rate"] * (now - site["last_sync"]) / 3600
+
+    def get_sync_schedule(self, site_urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Learned changes per hour and next scheduled poll for each site"""
+        schedule = {}
+        for site_url in site_urls:
+            site = self.sync_state.get_site(site_url)
+            schedule[site_url] = {
+                "changes_per_hour": site["change_rate"] if site else None,
+                "last_sync": datetime.fromtimestamp(site["last_sync"]).isoformat() if site and site["last_sync"] else None,
+                "next_sync": datetime.fromtimestamp(self._next_site_sync(site)).isoformat() if site else None
+            }
+        return schedule
+
+    def get_sync_progress(self) -> Dict[str, Dict[str, int]]:
+        """Per-site counts for the running or most recent sync"""
+        return {site_url: dict(progress) for site_url, progress in self.progress.items()}
+
+    async def _sync_single_site(self, site_url: str, full_resync: bool = False) -> Dict[str, Any]:
+        """Sync changed and deleted documents from a single SharePoint site, all libraries at once"""
         try:
             # Get site information
             site = await self._get_site_by_url(site_url)
@@ -98,40 +267,119 @@ class SharePointConnector:
                 raise Exception(f"Site not found: {site_url}")
             
             # Get document libraries
-            drives = await self.graph_client.sites.by_site_id(site.id).drives.get()
+            async with self.graph_semaphore:
+                drives = await self.graph_client.sites.by_site_id(site.id).drives.get()
             
             results = {
                 "synced": 0,
                 "failed": 0,
+                "deleted": 0,
                 "errors": []
             }
+            progress = self.progress[site_url] = {
+                "drives": 0, "relisted": 0, "changed": 0, "synced": 0, "failed": 0, "deleted": 0
+            }
             
-            for drive in drives.value:
-                if drive.drive_type == "documentLibrary":
-                    logger.info(f"Processing document library: {drive.name}")
-                    
-                    # Get documents from library
-                    documents = await self._get_documents_from_drive(site.id, drive.id)
-                    
-                    # Process documents
-                    for doc in documents:
-                        try:
-                            await self._sync_document(site, drive, doc)
-                            results["synced"] += 1
-                        except Exception as e:
-                            logger.error(f"Failed to sync document {doc.name}: {str(e)}")
-                            results["failed"] += 1
-                            results["errors"].append({
-                                "document": doc.name,
-                                "error": str(e)
-                            })
+            libraries = [drive for drive in drives.value if drive.drive_type == "documentLibrary"]
+            await asyncio.gather(*(
+                self._sync_drive(site, drive, full_resync, results, progress) for drive in libraries
+            ))
             
+            logger.info(
+                f"Finished site {site_url}: {progress['synced']} synced, "
+                f"{progress['failed']} failed, {progress['deleted']} deleted across {progress['drives']} libraries"
+            )
+            # Listing a library in full (resync, new library, expired delta link) counts
+            # every item as changed, which says nothing about the change rate
+            self._record_site_sync(
+                site_url, progress["changed"] + progress["deleted"], learn=not full_resync and not progress["relisted"]
+            )
             return results
             
         except Exception as e:
             logger.error(f"Failed to sync site {site_url}: {str(e)}")
             raise
 
+    async def _sync_drive(
+        self, site: Site, drive: DriveItem, full_resync: bool, results: Dict[str, Any], progress: Dict[str, int]
+    ):
+        """Stream one document library's changes to document_concurrency workers.
+        
+        Items are queued as each Graph page arrives, so syncing starts with the
+        first page and memory stays bounded by the queue, not the library size.
+        """
+        logger.info(f"Processing document library: {drive.name}")
+        progress["drives"] += 1
+        
+        # Get changes since the last successful sync of this library
+        delta_link = None if full_resync else self.sync_state.get_delta_link(drive.id)
+        cursor: Dict[str, Any] = {"delta_link": None, "relisted": False}
+        
+        # One listing of the library's blobs answers every "has it changed?" check;
+        # it is taken when the first changed document arrives
+        listing: Optional[asyncio.Future] = None
+        
+        def library_blobs() -> asyncio.Future:
+            nonlocal listing
+            if listing is None:
+                listing = asyncio.ensure_future(self._list_library_blobs(site, drive))
+            return listing
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.document_concurrency * 2)
+        drive_failed = 0
+        
+        async def produce():
+            try:
+                async for item, is_deleted in self._iter_drive_changes(drive.id, delta_link, cursor):
+                    if not is_deleted:
+                        progress["changed"] += 1
+                    await queue.put((item, is_deleted))
+            finally:
+                for _ in range(self.document_concurrency):
+                    await queue.put(None)
+        
+        async def worker():
+            nonlocal drive_failed
+            while (entry := await queue.get()) is not None:
+                doc, is_deleted = entry
+                if is_deleted:
+                    # Deleted items carry only their id
+                    try:
+                        await self._remove_from_search_index(doc.id)
+                        results["deleted"] += 1
+                        progress["deleted"] += 1
+                    except Exception as e:
+                        logger.error(f"Failed to remove deleted item {doc.id}: {str(e)}")
+                        drive_failed += 1
+                        results["failed"] += 1
+                        progress["failed"] += 1
+                        results["errors"].append({
+                            "document": doc.id,
+                            "error": str(e)
+                        })
+                    continue
+                try:
+                    await self._sync_document(site, drive, doc, await library_blobs())
+                    results["synced"] += 1
+                    progress["synced"] += 1
+                except Exception as e:
+                    logger.error(f"Failed to sync document {doc.name}: {str(e)}")
+                    drive_failed += 1
+                    results["failed"] += 1
+                    progress["failed"] += 1
+                    results["errors"].append({
+                        "document": doc.name,
+                        "error": str(e)
+                    })
+        
+        await asyncio.gather(produce(), *(worker() for _ in range(self.document_concurrency)))
+        if cursor["relisted"]:
+            progress["relisted"] += 1
+        
+        # Keep the old link after failures so the next run retries them
+        if cursor["delta_link"] and not drive_failed:
+            self.sync_state.set_delta_link(site.id, drive.id, cursor["delta_link"])
+
     async def _get_site_by_url(self, site_url: str) -> Optional[Site]:
         """Get SharePoint site by URL"""
         try:
@@ -142,41 +390,107 @@ class SharePointConnector:
             site_path = parsed_url.path
             
             # Get site using Graph API
-            site = await self.graph_client.sites.by_site_id(f"{hostname}:{site_path}").get()
+            async with self.graph_semaphore:
+                site = await self.graph_client.sites.by_site_id(f"{hostname}:{site_path}").get()
             return site
             
         except Exception as e:
             logger.error(f"Failed to get site {site_url}: {str(e)}")
             return None
 
-    async def _get_documents_from_drive(self, site_id: str, drive_id: str, folder_path: str = "") -> List[DriveItem]:
-        """Get all documents from a SharePoint drive"""
-        documents = []
+    async def _iter_drive_changes(
+        self, drive_id: str, delta_link: Optional[str], cursor: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[DriveItem, bool]]:
+        """Yield (item, is_deleted) for a drive's changes since delta_link, page by page.
+        
+        Without a usable delta link the drive is listed in full instead, after
+        taking a delta link for the current state, so changes made during the
+        listing are picked up next time, and cursor["relisted"] is set. Items
+        mapped before the listing that it did not return were deleted while
+        the link was unusable, and are yielded as deletions after it.
+        cursor["delta_link"] is set once the feed has been read to the end.
+        Items may repeat; re-syncing one is a cheap no-op.
+        """
+        request = self.graph_client.drives.by_drive_id(drive_id).items.by_drive_item_id("root").delta
+        page = None
+        
+        if delta_link:
+            try:
+                async with self.graph_semaphore:
+                    page = await request.with_url(delta_link).get()
+            except Exception as e:
+                # 410 Gone: the delta link expired and the drive must be listed again
+                if getattr(e, "response_status_code", None) != 410:
+                    raise
+                logger.warning(f"Delta link for drive {drive_id} expired, resyncing from scratch")
+                self.sync_state.clear_delta_link(drive_id)
+        
+        if page is None:
+            cursor["relisted"] = True
+            # Items mapped later (by webhooks, say) may be missing from the listing
+            mapped = self.sync_state.drive_item_ids(drive_id)
+            async with self.graph_semaphore:
+                latest = await request.with_url(
+                    f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root/delta?token=latest"
+                ).get()
+            seen = set()
+            async for item in self._iter_drive_documents(drive_id):
+                seen.add(item.id)
+                yield item, False
+            for item_id in mapped:
+                if item_id not in seen:
+                    yield DriveItem(id=item_id), True
+            cursor["delta_link"] = latest.odata_delta_link
+            return
+        
+        while True:
+            for item in page.value or []:
+                if item.deleted:
+                    yield item, True
+                elif item.file and self._is_supported_document(item.name):
+                    yield item, False
+            
+            if not page.odata_next_link:
+                cursor["delta_link"] = page.odata_delta_link
+                return
+            async with self.graph_semaphore:
+                page = await request.with_url(page.odata_next_link).get()
+
+    async def _iter_drive_documents(
+        self, drive_id: str, folder_id: str = "root", folder_path: str = ""
+    ) -> AsyncIterator[DriveItem]:
+        """Yield every supported document under a folder, following @odata.nextLink.
+        
+        Subfolders are addressed by item id, so nested paths resolve correctly,
+        and only the current page of each open folder is held in memory.
+        """
+        request = self.graph_client.drives.by_drive_id(drive_id).items.by_drive_item_id(folder_id).children
         
         try:
-            # Get items from root or specific folder
-            if folder_path:
-                items = await self.graph_client.sites.by_site_id(site_id).drives.by_drive_id(drive_id).root.item_with_path(folder_path).children.get()
-            else:
-                items = await self.graph_client.sites.by_site_id(site_id).drives.by_drive_id(drive_id).root.children.get()
-            
-            for item in items.value:
-                if item.file:  # It's a file
-                    # Check if it's a supported document type
-                    if self._is_supported_document(item.name):
-                        documents.append(item)
-                elif item.folder:  # It's a folder
-                    # Recursively get documents from subfolder
-                    subfolder_docs = await self._get_documents_from_drive(
-                        site_id, drive_id, item.name
-                    )
-                    documents.extend(subfolder_docs)
+            async with self.graph_semaphore:
+                page = await request.get()
             
-            return documents
+            while page:
+                for item in page.value or []:
+                    if item.file:  # It's a file
+                        # Check if it's a supported document type
+                        if self._is_supported_document(item.name):
+                            yield item
+                    elif item.folder:  # It's a folder
+                        # Recursively get documents from subfolder
+                        async for document in self._iter_drive_documents(
+                            drive_id, item.id, f"{folder_path}/{item.name}"
+                        ):
+                            yield document
+                
+                if not page.odata_next_link:
+                    break
+                async with self.graph_semaphore:
+                    page = await request.with_url(page.odata_next_link).get()
             
         except Exception as e:
-            logger.error(f"Failed to get documents from drive {drive_id}: {str(e)}")
-            return []
+            logger.error(f"Failed to list folder {folder_path or '/'} in drive {drive_id}: {str(e)}")
+            raise
 
     def _is_supported_document(self, filename: str) -> bool:
         """Check if document type is supported for processing"""
@@ -188,109 +502,365 @@ class SharePointConnector:
         file_extension = os.path.splitext(filename)[1].lower()
         return file_extension in supported_extensions
 
-    async def _sync_document(self, site: Site, drive: DriveItem, document: DriveItem):
-        """Sync a single document from SharePoint to blob storage and index"""
+    async def _sync_document(
+        self,
+        site: Site,
+        drive: DriveItem,
+        document: DriveItem,
+        existing: Optional[Dict[str, Tuple[datetime, int]]] = None
+    ):
+        """Sync a single document from SharePoint to blob storage and index.
+        
+        Content is deduplicated by SHA-256: bytes already stored for another
+        item are not committed or analysed again, the item just becomes one
+        more location on the shared index documents. existing is the library's
+        blob listing from _list_library_blobs, used for items synced before
+        their SharePoint version was recorded; without it (webhook changes)
+        the blob's properties are fetched individually.
+        """
         try:
-            # Check if document needs to be updated
             blob_name = self._generate_blob_name(site, drive, document)
+            previous = self.sync_state.get_item(document.id)
+            
+            # Check if document needs to be updated
+            if previous and previous["modified"] is not None:
+                # Deduplicated items have no blob of their own to compare with
+                synced = (datetime.fromisoformat(previous["modified"]), previous["size"])
+                should_update = previous["blob_name"] != blob_name or self._needs_update(synced, document)
+            elif existing is not None:
+                should_update = self._needs_update(existing.get(blob_name), document)
+            else:
+                async with self.blob_semaphore:
+                    should_update = await self._should_update_document(blob_name, document)
+            
+            if should_update and previous is None and await self._migrate_legacy_blob(site, drive, document, blob_name, existing):
+                logger.info(f"Moved {document.name} to {blob_name} without reindexing")
+                return
+            
+            if not should_update and (previous is None or previous["blob_name"] != blob_name):
+                # Record unmapped documents indexed before the mapping existed; an
+                # up-to-date blob alone does not prove its chunks reached the index
+                parent_id = self.document_processor.document_id(blob_name)
+                document_ids = None
+                if self.sync_state.content_at(blob_name) is None:
+                    document_ids = await self.document_processor.indexed_document_ids(parent_id)
+                if document_ids:
+                    self.sync_state.put_item(document.id, drive.id, blob_name, parent_id, document_ids)
+                    if previous:
+                        await self._release_item(previous)
+                else:
+                    should_update = True
+            
+            if not should_update:
+                logger.debug(f"Document up to date, skipping: {document.name}")
+                return
+            
+            # Stream the content from Graph into uncommitted blob blocks
+            async with self.graph_semaphore:
+                content_hash, commit = await self._stage_document_blob(site.id, drive.id, document, blob_name)
             
-            if await self._should_update_document(blob_name, document.last_modified_date_time):
-                # Download document content
-                content = await self._download_document_content(site.id, drive.id, document.id)
+            await self._vacate_blob(blob_name, content_hash)
+            async with self._content_lock(content_hash):
+                content = self.sync_state.get_content(content_hash)
+                shared = content is not None
                 
-                # Upload to blob storage
-                await self._upload_to_blob_storage(blob_name, content, document)
+                if content is None:
+                    await commit()
+                    
+                    # Process document for search index, keyed by content so a blob
+                    # name reused for different bytes never overwrites shared chunks
+                    try:
+                        async with self.processor_semaphore:
+                            result = await self.document_processor.process_document(
+                                blob_name, "documents", document_id=content_hash
+                            )
+                        if result["status"] != "success":
+                            raise Exception(result.get("error", "document processing failed"))
+                    except Exception:
+                        await self._discard_unindexed(blob_name, content_hash)
+                        raise
+                    
+                    content = {
+                        "blob_name": blob_name,
+                        "parent_id": result["document_id"],
+                        "document_ids": result["document_ids"]
+                    }
+                    self.sync_state.put_content(
+                        content_hash, blob_name, content["parent_id"], content["document_ids"]
+                    )
+                elif previous and previous["content_hash"] == content_hash and content["blob_name"] == previous["blob_name"] != blob_name:
+                    # A renamed or moved item takes the stored blob along
+                    await self._move_blob(previous["blob_name"], blob_name)
+                    content["blob_name"] = blob_name
+                    self.sync_state.put_content(
+                        content_hash, blob_name, content["parent_id"], content["document_ids"]
+                    )
                 
-                # Process document for search index
-                await self.document_processor.process_document(blob_name, "documents")
+                self.sync_state.put_item(
+                    document.id, drive.id, blob_name, content["parent_id"], content["document_ids"], content_hash,
+                    document.last_modified_date_time.isoformat() if document.last_modified_date_time else None,
+                    document.size
+                )
                 
-                logger.info(f"Successfully synced document: {document.name}")
+                if shared and (previous is None or (previous["content_hash"], previous["blob_name"]) != (content_hash, blob_name)):
+                    await self.document_processor.set_locations(
+                        content["document_ids"], self.sync_state.content_locations(content_hash)
+                    )
+            
+            # Edits, renames and moves leave the old content or blob behind
+            if previous and previous["content_hash"] != content_hash:
+                await self._release_item(previous)
+            
+            if shared:
+                logger.info(f"Synced document {document.name} as another location of {content['blob_name']}")
             else:
-                logger.debug(f"Document up to date, skipping: {document.name}")
-                
+                logger.info(f"Successfully synced document: {document.name}")
+        
         except Exception as e:
             logger.error(f"Failed to sync document {document.name}: {str(e)}")
             raise
 
-    def _generate_blob_name(self, site: Site, drive: DriveItem, document: DriveItem) -> str:
-        """Generate blob name for SharePoint document"""
-        # Create hierarchical path: sharepoint/site-name/library-name/document-name
+    async def _discard_unindexed(self, blob_name: str, content_hash: str):
+        """Undo a commit whose processing failed, so the next sync sees no blob and retries"""
+        blob_client = self.blob_client.get_blob_client(container="documents", blob=blob_name)
+        try:
+            async with self.blob_semaphore:
+                await blob_client.delete_blob()
+            # Chunks uploaded before the failure belong to no stored content
+            await self.document_processor.delete_document(content_hash)
+        except Exception as e:
+            logger.warning(f"Cleanup after failed processing of {blob_name} incomplete: {str(e)}")
+
+    async def _migrate_legacy_blob(
+        self,
+        site: Site,
+        drive: DriveItem,
+        document: DriveItem,
+        blob_name: str,
+        existing: Optional[Dict[str, Tuple[datetime, int]]] = None
+    ) -> bool:
+        """Carry over a blob stored before blob names held the item id.
+        
+        Such blobs sit at the library prefix plus the bare file name, indexed
+        under document_id of that name. If the blob's recorded SharePoint
+        version is the item's current one, it is moved to blob_name and its
+        chunks are adopted as they are, and True is returned. Otherwise the
+        blob and its chunks are deleted, so the item is synced afresh without
+        leaving them behind. Items of the same name in other folders shared
+        the old name, so at most one of them can adopt it. existing, the
+        library listing, saves a lookup when it has no such blob.
+        """
+        legacy_name = self._library_prefix(site, drive) + document.name
+        if existing is not None and legacy_name not in existing:
+            return False
+        async with self._content_lock(legacy_name):
+            if self.sync_state.blob_in_use(legacy_name):
+                return False
+            legacy_client = self.blob_client.get_blob_client(container="documents", blob=legacy_name)
+            try:
+                async with self.blob_semaphore:
+                    properties = await legacy_client.get_blob_properties()
+            except Exception:
+                return False
+            
+            parent_id = self.document_processor.document_id(legacy_name)
+            modified = document.last_modified_date_time.isoformat() if document.last_modified_date_time else None
+            recorded = (properties.metadata or {}).get("last_modified")
+            if recorded:
+                current = recorded == modified and properties.size == document.size
+            else:
+                current = not self._needs_update((properties.last_modified, properties.size), document)
+            document_ids = await self.document_processor.indexed_document_ids(parent_id) if current else None
+            
+            if document_ids:
+                await self._move_blob(legacy_name, blob_name)
+                self.sync_state.put_item(
+                    document.id, drive.id, blob_name, parent_id, document_ids, None, modified, document.size
+                )
+                await self.document_processor.set_locations(document_ids, [blob_name])
+                return True
+            
+            if not self.sync_state.parent_in_use(parent_id):
+                await self.document_processor.delete_document(parent_id)
+            async with self.blob_semaphore:
+                await legacy_client.delete_blob()
+            logger.info(f"Removed {legacy_name}, superseded by {blob_name}")
+            return False
+
+    def _content_lock(self, content_hash: str) -> asyncio.Lock:
+        """One lock per content hash, so identical documents are stored and analysed once.
+        
+        Legacy blob names are locked through it too; they never look like a hash.
+        """
+        lock = self.content_locks.get(content_hash)
+        if lock is None:
+            lock = self.content_locks[content_hash] = asyncio.Lock()
+        return lock
+
+    def _library_prefix(self, site: Site, drive: DriveItem) -> str:
+        """Blob prefix shared by every document in a library"""
+        # Create hierarchical path: sharepoint/site-name/library-name/
         site_name = site.display_name.replace(" ", "-").lower()
         library_name = drive.name.replace(" ", "-").lower()
         
-        return f"sharepoint/{site_name}/{library_name}/{document.name}"
+        return f"sharepoint/{site_name}/{library_name}/"
 
-    async def _should_update_document(self, blob_name: str, last_modified: datetime) -> bool:
-        """Check if document should be updated based on modification date"""
+    def _generate_blob_name(self, site: Site, drive: DriveItem, document: DriveItem) -> str:
+        """Generate blob name for SharePoint document.
+        
+        The item id keeps files of the same name in different folders of one
+        library apart; delta pages do not report folder paths, so it stands in
+        for the path.
+        """
+        return f"{self._library_prefix(site, drive)}{document.id}/{document.name}"
+
+    async def _list_library_blobs(self, site: Site, drive: DriveItem) -> Dict[str, Tuple[datetime, int]]:
+        """Map blob name to (last modified, size) for a library, from one paged listing"""
+        container_client = self.blob_client.get_container_client("documents")
+        existing: Dict[str, Tuple[datetime, int]] = {}
+        
+        async with self.blob_semaphore:
+            async for blob in container_client.list_blobs(name_starts_with=self._library_prefix(site, drive)):
+                existing[blob.name] = (blob.last_modified, blob.size)
+        
+        return existing
+
+    @staticmethod
+    def _needs_update(blob: Optional[Tuple[datetime, int]], document: DriveItem) -> bool:
+        """Decide locally whether a document differs from its stored blob"""
+        if blob is None:
+            return True
+        blob_modified, blob_size = blob
+        
+        # Update if SharePoint document is newer or its size changed
+        if document.last_modified_date_time and document.last_modified_date_time > blob_modified:
+            return True
+        return document.size is not None and document.size != blob_size
+
+    async def _should_update_document(self, blob_name: str, document: DriveItem) -> bool:
+        """Check a single document against its blob's properties"""
         try:
             blob_client = self.blob_client.get_blob_client(
                 container="documents",
                 blob=blob_name
             )
-            
-            async with blob_client:
-                properties = await blob_client.get_blob_properties()
-                blob_modified = properties.last_modified
-                
-                # Update if SharePoint document is newer
-                return last_modified > blob_modified
+            properties = await blob_client.get_blob_properties()
+            return self._needs_update((properties.last_modified, properties.size), document)
                 
         except Exception:
             # If blob doesn't exist or error occurs, update the document
             return True
 
-    async def _download_document_content(self, site_id: str, drive_id: str, item_id: str) -> bytes:
-        """Download document content from SharePoint"""
+    async def _stage_document_blob(
+        self, site_id: str, drive_id: str, document: DriveItem, blob_name: str
+    ) -> Tuple[str, Callable[[], Awaitable[None]]]:
+        """Pipe a document from Graph into block blob blocks without buffering the whole file.
+        
+        The response body is cut into BLOB_BLOCK_SIZE blocks, each staged as it
+        fills. MD5 and SHA-256 are computed on the fly. Returns the SHA-256 hex
+        digest and a commit coroutine function that makes the blob visible with
+        its metadata; blocks that are never committed are discarded by storage.
+        """
         try:
-            # Get download URL
-            download_url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drives/{drive_id}/items/{item_id}/content"
-            
-            # Get access token
+            download_url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drives/{drive_id}/items/{document.id}/content"
             token_result = await self.credential.get_token("https://graph.microsoft.com/.default")
+            headers = {"Authorization": f"Bearer {token_result.token}"}
             
-            # Download content
-            async with aiohttp.ClientSession() as session:
-                headers = {"Authorization": f"Bearer {token_result.token}"}
-                async with session.get(download_url, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.read()
-                    else:
-                        raise Exception(f"Failed to download document: HTTP {response.status}")
-                        
-        except Exception as e:
-            logger.error(f"Failed to download document content: {str(e)}")
-            raise
-
-    async def _upload_to_blob_storage(self, blob_name: str, content: bytes, document: DriveItem):
-        """Upload document to Azure Blob Storage"""
-        try:
             blob_client = self.blob_client.get_blob_client(
                 container="documents",
                 blob=blob_name
             )
             
+            md5 = hashlib.md5()
+            sha256 = hashlib.sha256()
+            block_ids: List[str] = []
+            size = 0
+            buffer = bytearray()
+            
+            async def stage(data: bytes):
+                # Random ids of equal length (the SDK base64-encodes them), so an
+                # upload never commits blocks another upload staged on this blob
+                block_id = uuid.uuid4().hex
+                async with self.blob_semaphore:
+                    await blob_client.stage_block(block_id, data)
+                block_ids.append(block_id)
+            
+            async with self.http_session.get(download_url, headers=headers) as response:
+                if response.status != 200:
+                    raise Exception(f"Failed to download document: HTTP {response.status}")
+                
+                async for data in response.content.iter_chunked(64 * 1024):
+                    md5.update(data)
+                    sha256.update(data)
+                    size += len(data)
+                    buffer.extend(data)
+                    if len(buffer) >= BLOB_BLOCK_SIZE:
+                        await stage(bytes(buffer[:BLOB_BLOCK_SIZE]))
+                        del buffer[:BLOB_BLOCK_SIZE]
+            
+            if buffer:
+                await stage(bytes(buffer))
+            
             # Prepare metadata
             metadata = {
                 "source": "SharePoint",
                 "original_name": document.name,
-                "size": str(len(content)),
+                "size": str(size),
                 "last_modified": document.last_modified_date_time.isoformat() if document.last_modified_date_time else "",
-                "content_type": document.file.mime_type if document.file else "application/octet-stream"
+                "content_type": document.file.mime_type if document.file else "application/octet-stream",
+                "content_sha256": sha256.hexdigest()
             }
             
-            async with blob_client:
-                await blob_client.upload_blob(
-                    content,
-                    overwrite=True,
-                    metadata=metadata
-                )
-                
-            logger.debug(f"Uploaded to blob storage: {blob_name}")
+            async def commit():
+                async with self.blob_semaphore:
+                    await blob_client.commit_block_list(
+                        block_ids,
+                        metadata=metadata,
+                        content_settings=ContentSettings(
+                            content_type=metadata["content_type"],
+                            content_md5=bytearray(md5.digest())
+                        )
+                    )
+                logger.debug(f"Streamed {size} bytes to blob storage: {blob_name}")
             
+            return metadata["content_sha256"], commit
+        
         except Exception as e:
-            logger.error(f"Failed to upload to blob storage: {str(e)}")
+            logger.error(f"Failed to copy document to blob storage: {str(e)}")
             raise
 
+    async def _move_blob(self, source: str, target: str):
+        """Server-side copy of a stored blob to another name, then delete the original"""
+        source_client = self.blob_client.get_blob_client(container="documents", blob=source)
+        target_client = self.blob_client.get_blob_client(container="documents", blob=target)
+        
+        async with self.blob_semaphore:
+            status = (await target_client.start_copy_from_url(source_client.url))["copy_status"]
+        while status == "pending":
+            await asyncio.sleep(1)
+            async with self.blob_semaphore:
+                status = (await target_client.get_blob_properties()).copy.status
+        if status != "success":
+            raise Exception(f"Copying {source} to {target} ended with status {status}")
+        
+        async with self.blob_semaphore:
+            await source_client.delete_blob()
+
+    async def _vacate_blob(self, blob_name: str, content_hash: str):
+        """Move content that other items still share off a blob about to receive different bytes"""
+        stored_hash = self.sync_state.content_at(blob_name)
+        if stored_hash is None or stored_hash == content_hash:
+            return
+        
+        async with self._content_lock(stored_hash):
+            content = self.sync_state.get_content(stored_hash)
+            if content is None or content["blob_name"] != blob_name:
+                return
+            others = [location for location in self.sync_state.content_locations(stored_hash) if location != blob_name]
+            if others:
+                await self._move_blob(blob_name, others[0])
+                self.sync_state.put_content(stored_hash, others[0], content["parent_id"], content["document_ids"])
+
     async def setup_webhook_subscriptions(self, site_urls: List[str]) -> Dict[str, Any]:
         """Set up webhook subscriptions for real-time document updates"""
         results = {
@@ -330,9 +900,14 @@ class SharePointConnector:
         return results
 
     async def handle_webhook_notification(self, notification: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle incoming webhook notification from SharePoint"""
+        """Queue an incoming SharePoint webhook notification and return at once.
+        
+        Notifications are stored durably and coalesced per resource, so a burst
+        of saves to one document results in one sync; process_notification_queue
+        does the work.
+        """
         try:
-            logger.info(f"Processing webhook notification: {notification}")
+            logger.info(f"Queueing webhook notification: {notification}")
             
             # Extract information from notification
             resource = notification.get("resource")
@@ -341,20 +916,65 @@ class SharePointConnector:
             if not resource or not change_type:
                 return {"status": "error", "message": "Invalid notification format"}
             
-            # Process based on change type
-            if change_type in ["created", "updated"]:
-                # Document was created or updated
-                await self._process_document_change(resource, change_type)
-            elif change_type == "deleted":
-                # Document was deleted
-                await self._process_document_deletion(resource)
+            if change_type not in ("created", "updated", "deleted"):
+                return {"status": "ignored", "queued": False}
             
-            return {"status": "success", "processed": True}
+            self.sync_state.enqueue_notification(
+                resource, change_type, self.webhook_debounce, self.webhook_max_delay
+            )
+            return {"status": "accepted", "queued": True}
             
         except Exception as e:
-            logger.error(f"Failed to handle webhook notification: {str(e)}")
+            logger.error(f"Failed to queue webhook notification: {str(e)}")
             return {"status": "error", "message": str(e)}
 
+    async def process_notification_queue(self, stop: asyncio.Event, poll_interval: float = 1.0):
+        """Process queued webhook notifications until stop is set.
+        
+        Up to webhook_concurrency notifications run at once. Failures are retried
+        with exponential backoff, up to webhook_max_attempts attempts; a
+        notification that arrives while its resource is being processed
+        triggers another pass instead of being lost.
+        """
+        self.sync_state.release_notifications()
+        in_flight: set = set()
+        
+        while not stop.is_set():
+            free = self.webhook_concurrency - len(in_flight)
+            if free > 0:
+                for entry in self.sync_state.claim_notifications(free):
+                    task = asyncio.create_task(self._process_queued_notification(entry))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+            
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def _process_queued_notification(self, entry: Dict[str, Any]):
+        resource = entry["resource"]
+        try:
+            if entry["change_type"] == "deleted":
+                await self._process_document_deletion(resource)
+            else:
+                await self._process_document_change(resource, entry["change_type"])
+        except Exception as e:
+            attempts = entry["attempts"] + 1
+            if attempts >= self.webhook_max_attempts:
+                # The next scheduled delta sync still picks up the item if it becomes readable
+                logger.error(f"Dropping notification for {resource} after {attempts} failed attempts: {str(e)}")
+                self.sync_state.abandon_notification(resource, entry["version"])
+                return
+            delay = min(WEBHOOK_RETRY_BASE_SECONDS * 2 ** entry["attempts"], WEBHOOK_RETRY_MAX_SECONDS)
+            logger.warning(f"Retrying notification for {resource} in {delay}s: {str(e)}")
+            self.sync_state.retry_notification(resource, delay)
+        else:
+            self.sync_state.complete_notification(resource, entry["version"], self.webhook_debounce)
+
     async def _process_document_change(self, resource: str, change_type: str):
         """Process document creation or update from webhook"""
         try:
@@ -379,57 +999,109 @@ class SharePointConnector:
                 
         except Exception as e:
             logger.error(f"Failed to process document change: {str(e)}")
+            raise
 
     async def _process_document_deletion(self, resource: str):
         """Process document deletion from webhook"""
         try:
-            # For deletions, we need to remove from search index and blob storage
-            # This requires mapping the resource to our blob naming convention
+            # For deletions, we need to remove from search index and blob storage;
+            # the sync mapping records which blob and chunks belong to the item
             
             # Extract document identifier from resource
             parts = resource.split('/')
             if len(parts) >= 6:
                 item_id = parts[5]
                 
-                # Find and remove from search index
-                # This is a simplified approach - in production, you'd maintain a mapping
+                # Remove from search index and blob storage
                 await self._remove_from_search_index(item_id)
                 
                 logger.info(f"Processed deletion for item: {item_id}")
                 
         except Exception as e:
             logger.error(f"Failed to process document deletion: {str(e)}")
+            raise
 
     async def _remove_from_search_index(self, item_id: str):
-        """Remove document from search index"""
-        try:
-            # Search for document by item ID in metadata
-            search_results = await self.document_processor.search_documents(
-                query=f"metadata_sharepoint_item_id:{item_id}",
-                top=1
-            )
+        """Remove a SharePoint item's blob and index documents using the sync mapping.
+        
+        The mapping is deleted only once they are gone, so a failure leaves it
+        for the retry and is raised to the caller.
+        """
+        mapping = self.sync_state.get_item(item_id)
+        if mapping is None:
+            logger.warning(f"No index mapping for deleted item {item_id}, nothing to remove")
+            return
+        
+        await self._release_item(mapping, deleted_item=item_id)
+        self.sync_state.delete_item(item_id)
+        
+        logger.info(f"Removed item {item_id} from search index: {mapping['blob_name']}")
+
+    async def _release_item(self, mapping: Dict[str, Any], deleted_item: Optional[str] = None):
+        """Drop what an item used to point at, once its mapping is replaced or deleted.
+        
+        Shared content stays while other items still reference it: they keep
+        the stored blob (moved to one of their names if it was under this
+        item's) and the index documents lose this location. Blobs and index
+        documents nothing references any more are deleted by key. An item
+        being deleted is passed as deleted_item while its mapping still
+        exists, and does not count as a reference.
+        """
+        content_hash = mapping.get("content_hash")
+        if content_hash is None:
+            await self._delete_unused(mapping, deleted_item)
+            return
+        
+        async with self._content_lock(content_hash):
+            content = self.sync_state.get_content(content_hash)
+            if content is None:
+                return
             
-            if search_results:
-                document_id = search_results[0]["id"]
-                
-                # Remove from search index
-                async with self.document_processor.search_client:
-                    await self.document_processor.search_client.delete_documents([{"id": document_id}])
-                
-                logger.info(f"Removed document from search index: {document_id}")
-                
+            locations = self.sync_state.content_locations(content_hash, deleted_item)
+            if locations:
+                if content["blob_name"] not in locations:
+                    await self._move_blob(content["blob_name"], locations[0])
+                    self.sync_state.put_content(
+                        content_hash, locations[0], content["parent_id"], content["document_ids"]
+                    )
+                await self.document_processor.set_locations(content["document_ids"], locations)
+                return
+            
+            self.sync_state.delete_content(content_hash)
+            try:
+                await self._delete_unused(content, deleted_item)
+            except Exception:
+                self.sync_state.put_content(
+                    content_hash, content["blob_name"], content["parent_id"], content["document_ids"]
+                )
+                raise
+
+    async def _delete_unused(self, stored: Dict[str, Any], deleted_item: Optional[str] = None):
+        """Delete a blob and its chunks from the index unless other content now uses them"""
+        if not self.sync_state.parent_in_use(stored["parent_id"], deleted_item):
+            await self.document_processor.delete_document(stored["parent_id"], stored["document_ids"])
+        
+        if self.sync_state.blob_in_use(stored["blob_name"], deleted_item):
+            return
+        blob_client = self.blob_client.get_blob_client(container="documents", blob=stored["blob_name"])
+        try:
+            async with self.blob_semaphore:
+                await blob_client.delete_blob()
         except Exception as e:
-            logger.error(f"Failed to remove from search index: {str(e)}")
+            logger.debug(f"Blob {stored['blob_name']} not deleted: {str(e)}")
 
     async def close(self):
         """Close all clients"""
         try:
             if self.blob_client:
                 await self.blob_client.close()
+            if self.http_session:
+                await self.http_session.close()
             if self.document_processor:
                 await self.document_processor.close()
             if self.credential:
                 await self.credential.close()
+            self.sync_state.close()
         except Exception as e:
             logger.error(f"Error closing SharePoint connector: {str(e)}")
 
@@ -446,7 +1118,27 @@ def load_sharepoint_config() -> Dict[str, Any]:
         "openai_api_key": os.getenv("OPENAI_API_KEY"),
         "openai_api_version": os.getenv("OPENAI_API_VERSION", "2023-12-01-preview"),
         "openai_deployment": os.getenv("OPENAI_GPT4_DEPLOYMENT", "gpt-4"),
+        "openai_json_mode": os.getenv("OPENAI_JSON_MODE", "false").lower() == "true",
         "embedding_deployment": os.getenv("OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002"),
+        "batch_concurrency": int(os.getenv("PROCESS_BATCH_CONCURRENCY", "5")),
+        "batch_max_concurrency": int(os.getenv("PROCESS_BATCH_MAX_CONCURRENCY", "20")),
+        "cache_path": os.getenv("KB_CACHE_PATH", ".cache/kb_cache.sqlite"),
+        "layout_cache_mb": int(os.getenv("KB_LAYOUT_CACHE_MB", "512")),
+        "search_cache_ttl": float(os.getenv("KB_SEARCH_CACHE_TTL_SECONDS", "300")),
+        "search_cache_size": int(os.getenv("KB_SEARCH_CACHE_MAX_ENTRIES", "1000")),
+        "sync_state_path": os.getenv("SHAREPOINT_SYNC_STATE_PATH", ".cache/sharepoint_sync.sqlite"),
+        "site_concurrency": int(os.getenv("SHAREPOINT_SITE_CONCURRENCY", "4")),
+        "document_concurrency": int(os.getenv("SHAREPOINT_DOCUMENT_CONCURRENCY", "16")),
+        "graph_concurrency": int(os.getenv("SHAREPOINT_GRAPH_CONCURRENCY", "8")),
+        "blob_concurrency": int(os.getenv("SHAREPOINT_BLOB_CONCURRENCY", "8")),
+        "webhook_debounce_seconds": float(os.getenv("SHAREPOINT_WEBHOOK_DEBOUNCE_SECONDS", "5")),
+        "webhook_max_delay_seconds": float(os.getenv("SHAREPOINT_WEBHOOK_MAX_DELAY_SECONDS", "30")),
+        "webhook_concurrency": int(os.getenv("SHAREPOINT_WEBHOOK_CONCURRENCY", "4")),
+        "webhook_max_attempts": int(os.getenv("SHAREPOINT_WEBHOOK_MAX_ATTEMPTS", "8")),
+        "sync_continuous": os.getenv("SHAREPOINT_SYNC_CONTINUOUS", "false").lower() == "true",
+        "sync_min_interval_seconds": float(os.getenv("SHAREPOINT_SYNC_MIN_INTERVAL_SECONDS", "300")),
+        "sync_max_interval_seconds": float(os.getenv("SHAREPOINT_SYNC_MAX_INTERVAL_SECONDS", "21600")),
+        "sync_target_changes": float(os.getenv("SHAREPOINT_SYNC_TARGET_CHANGES", "25")),
         "webhook_url": os.getenv("SHAREPOINT_WEBHOOK_URL"),
         "sharepoint_sites": os.getenv("SHAREPOINT_SITES", "").split(",") if os.getenv("SHAREPOINT_SITES") else []
     }
@@ -471,7 +1163,7 @@ async def main():
         ]
         
         # Sync documents from SharePoint
-        if config["sharepoint_sites"]:
+        if config["sharepoint_sites"] and not config["sync_continuous"]:
             result = await connector.sync_sharepoint_sites(config["sharepoint_sites"])
             print(f"Sync result: {result}")
         
@@ -479,6 +1171,17 @@ async def main():
         webhook_result = await connector.setup_webhook_subscriptions(test_sites)
         print(f"Webhook setup result: {webhook_result}")
         
+        # Keep polling sites by change rate and draining webhook notifications until stopped
+        if config["sharepoint_sites"] and config["sync_continuous"]:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop.set)
+            await asyncio.gather(
+                connector.run_sync_scheduler(config["sharepoint_sites"], stop),
+                connector.process_notification_queue(stop)
+            )
+        
     except Exception as e:
         logger.error(f"Main execution failed: {str(e)}")
     finally:
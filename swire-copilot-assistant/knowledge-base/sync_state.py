@@ -0,0 +1,279 @@
+"""
+Persistent SharePoint sync state for the Swire knowledge base pipeline
+Remembers Graph delta links per drive so each sync fetches only changes,
+which blob and index documents belong to each SharePoint item, which items
+share identical content, how often each site changes, and webhook
+notifications waiting to be processed
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class SyncState:
+    """SQLite store for delta links (by drive id), item mappings (by drive item id),
+    stored content (by SHA-256), site change rates (by site URL) and the webhook
+    notification queue (by resource)"""
+
+    def __init__(self, path: Path):
+        self.conn = _connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS delta_links (
+                drive_id TEXT PRIMARY KEY,
+                site_id TEXT NOT NULL,
+                delta_link TEXT NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                item_id TEXT PRIMARY KEY,
+                drive_id TEXT NOT NULL,
+                blob_name TEXT NOT NULL,
+                parent_id TEXT NOT NULL,
+                document_ids TEXT,
+                updated REAL NOT NULL
+            )"""
+        )
+        # Items mapped before content deduplication have no hash or source version
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(items)")}
+        for column, column_type in (("content_hash", "TEXT"), ("modified", "TEXT"), ("size", "INTEGER")):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE items ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_content_hash ON items (content_hash)")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS contents (
+                content_hash TEXT PRIMARY KEY,
+                blob_name TEXT NOT NULL,
+                parent_id TEXT NOT NULL,
+                document_ids TEXT NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS sites (
+                site_url TEXT PRIMARY KEY,
+                last_sync REAL,
+                last_attempt REAL NOT NULL,
+                change_rate REAL
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS notifications (
+                resource TEXT PRIMARY KEY,
+                change_type TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                due REAL NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+
+    def get_delta_link(self, drive_id: str) -> Optional[str]:
+        row = self.conn.execute("SELECT delta_link FROM delta_links WHERE drive_id = ?", (drive_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_delta_link(self, site_id: str, drive_id: str, delta_link: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO delta_links VALUES (?, ?, ?, ?)", (drive_id, site_id, delta_link, time.time())
+        )
+
+    def clear_delta_link(self, drive_id: str):
+        self.conn.execute("DELETE FROM delta_links WHERE drive_id = ?", (drive_id,))
+
+    def get_item(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """Blob name, parent id, index document ids (None if unknown), content hash
+        and the SharePoint version last synced for an item"""
+        row = self.conn.execute(
+            """SELECT drive_id, blob_name, parent_id, document_ids, content_hash, modified, size
+            FROM items WHERE item_id = ?""",
+            (item_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        drive_id, blob_name, parent_id, document_ids, content_hash, modified, size = row
+        return {
+            "drive_id": drive_id,
+            "blob_name": blob_name,
+            "parent_id": parent_id,
+            "document_ids": json.loads(document_ids) if document_ids else None,
+            "content_hash": content_hash,
+            "modified": modified,
+            "size": size
+        }
+
+    def put_item(
+        self,
+        item_id: str,
+        drive_id: str,
+        blob_name: str,
+        parent_id: str,
+        document_ids: Optional[List[str]],
+        content_hash: Optional[str] = None,
+        modified: Optional[str] = None,
+        size: Optional[int] = None,
+    ):
+        self.conn.execute(
+            """INSERT OR REPLACE INTO items
+            (item_id, drive_id, blob_name, parent_id, document_ids, updated, content_hash, modified, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                item_id, drive_id, blob_name, parent_id,
+                json.dumps(document_ids) if document_ids is not None else None, time.time(),
+                content_hash, modified, size
+            ),
+        )
+
+    def delete_item(self, item_id: str):
+        self.conn.execute("DELETE FROM items WHERE item_id = ?", (item_id,))
+
+    def get_content(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Stored blob, parent id and index document ids for a piece of content"""
+        row = self.conn.execute(
+            "SELECT blob_name, parent_id, document_ids FROM contents WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        blob_name, parent_id, document_ids = row
+        return {"blob_name": blob_name, "parent_id": parent_id, "document_ids": json.loads(document_ids)}
+
+    def put_content(self, content_hash: str, blob_name: str, parent_id: str, document_ids: List[str]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO contents VALUES (?, ?, ?, ?, ?)",
+            (content_hash, blob_name, parent_id, json.dumps(document_ids), time.time()),
+        )
+
+    def delete_content(self, content_hash: str):
+        self.conn.execute("DELETE FROM contents WHERE content_hash = ?", (content_hash,))
+
+    def content_at(self, blob_name: str) -> Optional[str]:
+        """Hash of the content stored in a blob, if any"""
+        row = self.conn.execute("SELECT content_hash FROM contents WHERE blob_name = ?", (blob_name,)).fetchone()
+        return row[0] if row else None
+
+    def drive_item_ids(self, drive_id: str) -> List[str]:
+        """Ids of every item mapped in a drive"""
+        rows = self.conn.execute("SELECT item_id FROM items WHERE drive_id = ?", (drive_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def content_locations(self, content_hash: str, exclude_item: Optional[str] = None) -> List[str]:
+        """Blob names of every item whose current content has this hash, bar exclude_item"""
+        rows = self.conn.execute(
+            "SELECT blob_name FROM items WHERE content_hash = ? AND item_id IS NOT ? ORDER BY blob_name",
+            (content_hash, exclude_item),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def blob_in_use(self, blob_name: str, exclude_item: Optional[str] = None) -> bool:
+        """Whether stored content or an item mapped before deduplication, bar exclude_item, owns the blob"""
+        row = self.conn.execute(
+            """SELECT 1 FROM contents WHERE blob_name = ?
+            UNION ALL SELECT 1 FROM items
+            WHERE blob_name = ? AND content_hash IS NULL AND item_id IS NOT ? LIMIT 1""",
+            (blob_name, blob_name, exclude_item),
+        ).fetchone()
+        return row is not None
+
+    def parent_in_use(self, parent_id: str, exclude_item: Optional[str] = None) -> bool:
+        """Whether stored content or an item mapped before deduplication, bar exclude_item,
+        owns the index parent id"""
+        row = self.conn.execute(
+            """SELECT 1 FROM contents WHERE parent_id = ?
+            UNION ALL SELECT 1 FROM items
+            WHERE parent_id = ? AND content_hash IS NULL AND item_id IS NOT ? LIMIT 1""",
+            (parent_id, parent_id, exclude_item),
+        ).fetchone()
+        return row is not None
+
+    def get_site(self, site_url: str) -> Optional[Dict[str, Any]]:
+        """Last successful sync, last attempt and learned changes per hour (None until known)"""
+        row = self.conn.execute(
+            "SELECT last_sync, last_attempt, change_rate FROM sites WHERE site_url = ?", (site_url,)
+        ).fetchone()
+        if row is None:
+            return None
+        last_sync, last_attempt, change_rate = row
+        return {"last_sync": last_sync, "last_attempt": last_attempt, "change_rate": change_rate}
+
+    def put_site(self, site_url: str, last_sync: Optional[float], last_attempt: float, change_rate: Optional[float]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sites VALUES (?, ?, ?, ?)", (site_url, last_sync, last_attempt, change_rate)
+        )
+
+    def enqueue_notification(self, resource: str, change_type: str, debounce: float, max_delay: float):
+        """Queue a change, coalescing with any pending one for the same resource.
+        
+        Each repeat pushes the due time out by debounce, but never past
+        max_delay after the first notification, and the latest change type wins.
+        """
+        now = time.time()
+        self.conn.execute(
+            """INSERT INTO notifications (resource, change_type, first_seen, due) VALUES (?, ?, ?, ?)
+            ON CONFLICT(resource) DO UPDATE SET
+                change_type = excluded.change_type,
+                due = MIN(excluded.due, notifications.first_seen + ?),
+                version = notifications.version + 1""",
+            (resource, change_type, now, now + debounce, max_delay),
+        )
+
+    def claim_notifications(self, limit: int) -> List[Dict[str, Any]]:
+        """Claim up to limit due, unclaimed notifications, oldest first"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                """SELECT resource, change_type, version, attempts FROM notifications
+                WHERE claimed = 0 AND due <= ? ORDER BY due LIMIT ?""",
+                (time.time(), limit),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE notifications SET claimed = 1 WHERE resource = ?", [(row[0],) for row in rows]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [
+            {"resource": resource, "change_type": change_type, "version": version, "attempts": attempts}
+            for resource, change_type, version, attempts in rows
+        ]
+
+    def complete_notification(self, resource: str, version: int, debounce: float):
+        """Drop a processed notification; one that changed meanwhile starts a new debounce window"""
+        now = time.time()
+        self.conn.execute("DELETE FROM notifications WHERE resource = ? AND version = ?", (resource, version))
+        self.conn.execute(
+            "UPDATE notifications SET claimed = 0, first_seen = ?, due = MAX(due, ?) WHERE resource = ?",
+            (now, now + debounce, resource),
+        )
+
+    def retry_notification(self, resource: str, delay: float):
+        self.conn.execute(
+            "UPDATE notifications SET claimed = 0, attempts = attempts + 1, due = ? WHERE resource = ?",
+            (time.time() + delay, resource),
+        )
+
+    def abandon_notification(self, resource: str, version: int):
+        """Drop a notification that keeps failing; a change queued meanwhile gets its own attempts"""
+        self.conn.execute("DELETE FROM notifications WHERE resource = ? AND version = ?", (resource, version))
+        self.conn.execute("UPDATE notifications SET claimed = 0, attempts = 0 WHERE resource = ?", (resource,))
+
+    def release_notifications(self):
+        """Unclaim everything, e.g. after a worker stopped mid-batch"""
+        self.conn.execute("UPDATE notifications SET claimed = 0 WHERE claimed = 1")
+
+    def pending_notifications(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
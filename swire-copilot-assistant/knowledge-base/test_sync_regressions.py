@@ -0,0 +1,278 @@
+"""
+Regression checks for the Swire knowledge base SharePoint sync
+Runs sharepoint-connector.py and document-processor.py end to end against the
+local services in fake_services.py, as benchmark-sync.py does
+Run directly: python test_sync_regressions.py
+"""
+
+import asyncio
+import importlib.util
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from fake_services import FakeServices, FakeTenant, ServiceBehaviour
+
+HERE = Path(__file__).resolve().parent
+
+
+def load_pipeline_module(name: str, filename: str):
+    """Import one of the hyphenated pipeline scripts under an importable name"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[name]
+        raise
+    module.logger.setLevel(logging.CRITICAL)
+    return module
+
+
+def build_pipeline(tenant: FakeTenant, work: str) -> Tuple[Any, FakeServices]:
+    """A connector and document processor wired to fresh fake services for tenant"""
+    processor_module = load_pipeline_module("document_processor", "document-processor.py")
+    connector_module = load_pipeline_module("sharepoint_connector", "sharepoint-connector.py")
+
+    config = connector_module.load_sharepoint_config()
+    config.update({
+        "storage_account": "devstoreaccount1",
+        "cache_path": str(Path(work) / "kb_cache.sqlite"),
+        "sync_state_path": str(Path(work) / "sharepoint_sync.sqlite"),
+        "sharepoint_sites": tenant.site_urls(),
+    })
+    processor = processor_module.DocumentProcessor(config)
+    connector = connector_module.SharePointConnector(config)
+    services = FakeServices(tenant, {"search": ServiceBehaviour("search")})
+    services.attach_connector(connector, processor)
+    return connector, services
+
+
+def single_library_tenant() -> Tuple[FakeTenant, str]:
+    tenant = FakeTenant()
+    drive_id = tenant.add_library(tenant.add_site("policies"), "Documents")
+    return tenant, drive_id
+
+
+def indexed_locations(services: FakeServices) -> List[str]:
+    return sorted({location for document in services.search.documents.values() for location in document["locations"]})
+
+
+def stored_blobs(services: FakeServices) -> List[str]:
+    return sorted(services.blob.containers.get("documents", {}))
+
+
+def run(check):
+    """Run an async check in a scratch directory"""
+    with tempfile.TemporaryDirectory(prefix="kb-regression-") as work:
+        asyncio.run(check(work))
+
+
+def test_deletes_while_delta_link_expired():
+    """Items deleted while the delta link was unusable are removed by the relist"""
+    async def check(work: str):
+        tenant, drive_id = single_library_tenant()
+        kept = tenant.add_document(drive_id, "kept.txt", b"Safety procedure for lifting operations")
+        gone = tenant.add_document(drive_id, "gone.txt", b"Superseded permit to work procedure")
+        connector, services = build_pipeline(tenant, work)
+        try:
+            await connector.sync_sharepoint_sites(tenant.site_urls())
+            gone_blob = connector.sync_state.get_item(gone)["blob_name"]
+
+            tenant.delete_document(gone)
+            tenant.expire_delta_links()
+            result = await connector.sync_sharepoint_sites(tenant.site_urls())
+
+            assert result["documents_deleted"] == 1, result
+            assert connector.sync_state.get_item(gone) is None
+            assert connector.sync_state.get_item(kept) is not None
+            assert gone_blob not in stored_blobs(services)
+            assert gone_blob not in indexed_locations(services)
+        finally:
+            await connector.close()
+
+    run(check)
+
+
+def test_failed_delete_keeps_delta_link():
+    """A deletion that fails keeps the old delta link and its mapping, so the next sync retries it"""
+    async def check(work: str):
+        tenant, drive_id = single_library_tenant()
+        item_id = tenant.add_document(drive_id, "gone.txt", b"Superseded permit to work procedure")
+        connector, services = build_pipeline(tenant, work)
+        try:
+            await connector.sync_sharepoint_sites(tenant.site_urls())
+            delta_link = connector.sync_state.get_delta_link(drive_id)
+            blob_name = connector.sync_state.get_item(item_id)["blob_name"]
+
+            tenant.delete_document(item_id)
+            services.behaviours["search"].error_rate = 1.0
+            result = await connector.sync_sharepoint_sites(tenant.site_urls())
+            assert result["documents_failed"] == 1, result
+            assert connector.sync_state.get_delta_link(drive_id) == delta_link
+            assert connector.sync_state.get_item(item_id) is not None
+
+            services.behaviours["search"].error_rate = 0.0
+            result = await connector.sync_sharepoint_sites(tenant.site_urls())
+            assert result["documents_deleted"] == 1, result
+            assert connector.sync_state.get_item(item_id) is None
+            assert blob_name not in stored_blobs(services)
+            assert blob_name not in indexed_locations(services)
+        finally:
+            await connector.close()
+
+    run(check)
+
+
+def test_same_name_in_different_folders():
+    """Files of the same name in different folders of one library keep separate blobs and chunks"""
+    async def check(work: str):
+        tenant, drive_id = single_library_tenant()
+        item_ids = [
+            tenant.add_document(drive_id, "Safety Policy.pdf", b"Safety policy 2023 for marine operations", folder)
+            for folder in (tenant.add_folder(drive_id, "2023"), tenant.add_folder(drive_id, "2024"))
+        ]
+        tenant.update_document(item_ids[1], b"Safety policy 2024 for marine and terminal operations")
+        connector, services = build_pipeline(tenant, work)
+        try:
+            result = await connector.sync_sharepoint_sites(tenant.site_urls())
+            assert result["documents_synced"] == 2, result
+
+            blob_names = [connector.sync_state.get_item(item_id)["blob_name"] for item_id in item_ids]
+            assert len(set(blob_names)) == 2, blob_names
+            for item_id, blob_name in zip(item_ids, blob_names):
+                assert services.blob.containers["documents"][blob_name].data == tenant.content(item_id)
+            assert indexed_locations(services) == sorted(blob_names)
+        finally:
+            await connector.close()
+
+    run(check)
+
+
+def test_legacy_blobs_migrate_without_reindexing():
+    """Blobs stored under the bare file name move to the item-scoped name and keep their chunks
+    until the item next changes"""
+    async def check(work: str):
+        tenant, drive_id = single_library_tenant()
+        content = b"Permit to work procedure for confined space entry"
+        item_id = tenant.add_document(drive_id, "Permit Procedure.pdf", content)
+        document = tenant.drives[drive_id]["items"][item_id]["item"]
+        connector, services = build_pipeline(tenant, work)
+        processor = connector.document_processor
+        try:
+            # What a sync before blob names carried the item id left behind
+            legacy_name = "sharepoint/policies/documents/Permit Procedure.pdf"
+            await services.blob.get_blob_client("documents", legacy_name).upload_blob(content, metadata={
+                "source": "SharePoint",
+                "original_name": document.name,
+                "size": str(len(content)),
+                "last_modified": document.last_modified_date_time.isoformat(),
+            })
+            result = await processor.process_document(legacy_name, "documents")
+            assert result["status"] == "success", result
+            chunks = sorted(services.search.documents)
+
+            services.reset_stats()
+            result = await connector.sync_sharepoint_sites(tenant.site_urls())
+            assert result["documents_synced"] == 1, result
+            assert services.behaviours["form_recognizer"].calls == 0
+            assert services.behaviours["openai"].calls == 0
+            blob_name = connector.sync_state.get_item(item_id)["blob_name"]
+            assert stored_blobs(services) == [blob_name] != [legacy_name]
+            assert sorted(services.search.documents) == chunks
+            assert indexed_locations(services) == [blob_name]
+
+            # An edit replaces the adopted chunks rather than indexing alongside them
+            tenant.update_document(item_id, content + b" and hot work")
+            await connector.sync_sharepoint_sites(tenant.site_urls())
+            assert not set(chunks) & set(services.search.documents)
+            assert indexed_locations(services) == [blob_name]
+        finally:
+            await connector.close()
+
+    run(check)
+
+
+def test_outdated_legacy_blobs_are_removed():
+    """A legacy blob older than its item is deleted with its chunks, and the item indexed afresh"""
+    async def check(work: str):
+        tenant, drive_id = single_library_tenant()
+        item_id = tenant.add_document(drive_id, "Permit Procedure.pdf", b"Permit to work procedure, revision 2")
+        connector, services = build_pipeline(tenant, work)
+        processor = connector.document_processor
+        try:
+            legacy_name = "sharepoint/policies/documents/Permit Procedure.pdf"
+            await services.blob.get_blob_client("documents", legacy_name).upload_blob(
+                b"Permit to work procedure, revision 1",
+                metadata={"source": "SharePoint", "last_modified": "2020-01-01T00:00:00+00:00"}
+            )
+            await processor.process_document(legacy_name, "documents")
+            chunks = set(services.search.documents)
+
+            await connector.sync_sharepoint_sites(tenant.site_urls())
+            blob_name = connector.sync_state.get_item(item_id)["blob_name"]
+            assert stored_blobs(services) == [blob_name]
+            assert not chunks & set(services.search.documents)
+            assert indexed_locations(services) == [blob_name]
+        finally:
+            await connector.close()
+
+    run(check)
+
+
+def test_tagging_failures_do_not_stall_documents():
+    """Documents waiting on a tagging batch finish even when storing its tags fails"""
+    async def check(work: str):
+        tenant, drive_id = single_library_tenant()
+        item_ids = [
+            tenant.add_document(drive_id, f"Procedure {index}.txt", f"Lifting procedure number {index}".encode())
+            for index in range(5)
+        ]
+        connector, services = build_pipeline(tenant, work)
+
+        def fail(*args: Any, **kwargs: Any):
+            raise RuntimeError("database is locked")
+
+        connector.document_processor.tag_cache.put = fail
+        try:
+            result = await asyncio.wait_for(connector.sync_sharepoint_sites(tenant.site_urls()), 60)
+            assert result["documents_synced"] == len(item_ids), result
+            assert all(document["tags"] for document in services.search.documents.values())
+        finally:
+            await connector.close()
+
+    run(check)
+
+
+TESTS = [
+    test_deletes_while_delta_link_expired,
+    test_failed_delete_keeps_delta_link,
+    test_same_name_in_different_folders,
+    test_legacy_blobs_migrate_without_reindexing,
+    test_outdated_legacy_blobs_are_removed,
+    test_tagging_failures_do_not_stall_documents,
+]
+
+
+def main(selected: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.CRITICAL)
+    failed = 0
+    for test in TESTS:
+        if selected and test.__name__ not in selected:
+            continue
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {type(e).__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))